@@ -1,20 +1,143 @@
 # ANALYSIS_ID: default
 # ANALYSIS_LABEL: Migration Analysis
+import io
 import os
 import re
 import json
+import time
+import logging
+import random
+import hashlib
+import sqlite3
+import threading
 import requests
 import subprocess
 import sys
-from typing import TypedDict, List, Dict, Any, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from itertools import islice
+from typing import TypedDict, List, Dict, Any, Optional, Iterable, Iterator
 from urllib.parse import quote, urlparse, parse_qs, urlencode, urlunparse
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.outputs import ChatResult, ChatGeneration
+from pydantic import PrivateAttr
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 import argparse
 
+# orjson is optional; it is a much faster drop-in for parsing replies and hashing payloads
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_loads(data):
+    return orjson.loads(data) if orjson else json.loads(data)
+
+def json_dumps(obj, sort_keys: bool = False) -> str:
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0).decode("utf-8")
+    return json.dumps(obj, sort_keys=sort_keys, ensure_ascii=False, separators=(",", ":"))
+
+# Per-request diagnostics; silent unless a handler is configured at DEBUG level
+logger = logging.getLogger("repocloner.llm")
+
+# Upper bound on concurrent LLM requests issued by a single pipeline node
+MAX_LLM_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+# Process-wide cap on in-flight LLM requests, shared by nodes running in parallel
+LLM_MAX_INFLIGHT = int(os.environ.get("LLM_MAX_INFLIGHT", str(MAX_LLM_CONCURRENCY * 2)))
+LLM_REQUEST_SLOTS = threading.BoundedSemaphore(LLM_MAX_INFLIGHT)
+# Prompt templates: the static instructions always come first and the per-call
+# content last, so repeated calls share a byte-identical prefix that providers can cache
+SUMMARIZE_PROMPT = "Summarize the purpose and functionality of this code:\n\n"
+SUMMARIZE_PACK_PROMPT = (
+    "Summarize the purpose and functionality of each code chunk below. "
+    "Return a JSON array of strings with exactly one summary per chunk, in chunk order.\n\n"
+)
+KAFKA_SCAN_PROMPT = (
+    "You are analyzing a .NET Core repository. "
+    "Does this code use Kafka (e.g., Confluent.Kafka, Kafka APIs, producers, consumers, topics, partitions)? "
+    "If yes, return a JSON object with fields: "
+    "{'file': 'relative/path', 'kafka_apis': [...], 'summary': '...'}.\n"
+    "If not, return {}.\n\n"
+    "Code chunk:\n"
+)
+KAFKA_SCAN_PACK_PROMPT = (
+    "You are analyzing a .NET Core repository. "
+    "For each code chunk below, decide whether it uses Kafka "
+    "(e.g., Confluent.Kafka, Kafka APIs, producers, consumers, topics, partitions). "
+    "Return a JSON array with exactly one element per chunk, in chunk order: "
+    "{'id': N, 'file': 'relative/path', 'kafka_apis': [...], 'summary': '...'} "
+    "if the chunk uses Kafka, otherwise null.\n\n"
+)
+CODE_DIFF_PROMPT = (
+    "You are a .NET Core expert.\n\n"
+    "Task:\n"
+    "- Show a unified diff patch (`diff` style) that replaces Kafka usage with Azure.Messaging.ServiceBus.\n"
+    "- Cover producers, consumers, config, and error handling.\n"
+    "- Keep namespaces, classes, and non-Kafka code intact.\n"
+    "- If no Kafka usage is present, return an empty diff.\n\n"
+)
+
+# Response-parsing patterns, compiled once instead of on every call
+JSON_TOKEN_RE = re.compile(r'[{}\[\]"\\]')
+FENCED_BLOCK_RE = re.compile(r"```(\w+)?\s*\n([\s\S]*?)\n```", re.I)
+DIFF_CONTENT_RE = re.compile(r"^(diff --git|---\s|\+\+\+\s|@@)", re.M)
+# Cheap local check for chunks that could possibly use Kafka; others skip the LLM scan.
+# "kafka" matches anywhere (Confluent.Kafka, KafkaOptions, AddKafka, kafka-clients);
+# the client-API names only as whole words.
+KAFKA_HINTS_RE = re.compile(
+    r"kafka|\b(?:IProducer|IConsumer|ProducerBuilder|ConsumerBuilder|ProducerConfig|ConsumerConfig|Bootstrap\.?Servers|topics?)\b",
+    re.I,
+)
+# Start of an unfenced diff: a diff header or hunk header at the beginning of a line.
+# [^\S\n] keeps the whitespace checks within the line, as a per-line match would.
+DIFF_START_RE = re.compile(r"^(?:diff --git|index[^\S\n]|---[^\S\n][^\-\n]|\+\+\+[^\S\n][^+\n]|@@[^\S\n])", re.M)
+OTHER_LINE_BREAK_RE = re.compile("[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+# Keywords the static fallback looks for, matched case-insensitively in one pass
+STATIC_KAFKA_KEYWORDS_RE = re.compile(r"kafka|producer|consumer|confluent", re.I)
+# URLs (absolute, or the path form urllib3 uses in connection errors) that carry a query string
+URL_WITH_QUERY_RE = re.compile(r"(?:https?://|/)[^\s'\"()]*\?[^\s'\"()]+")
+
+# File extensions (without the dot) never sent to the model
+EXCLUDED_EXTENSIONS = frozenset({"png", "jpg", "exe", "dll", "bin"})
+# Characters per code chunk sent to the model; chunks are cut at line breaks within this budget.
+# Larger-context models can take bigger chunks (roughly four characters per token) and so fewer calls
+MAX_CHUNK_SIZE = int(os.environ.get("LLM_CHUNK_CHARS", "4000"))
+# Threads used to read source files ahead of the LLM dispatch; raise it for
+# network-mounted or cold checkouts where reads are latency bound
+FILE_READ_WORKERS = int(os.environ.get("REPO_READ_WORKERS", str(min(32, (os.cpu_count() or 1) * 4))))
+# Code chunks packed into one summarize or Kafka-scan request
+SCAN_CHUNKS_PER_REQUEST = int(os.environ.get("LLM_SCAN_PACK_SIZE", "10"))
+# Characters of code per packed request, so a pack of large chunks stays well inside the context window
+PACK_MAX_CHARS = int(os.environ.get("LLM_PACK_MAX_CHARS", "24000"))
+# Files longer than this are sent to the diff prompt as Kafka-related excerpts
+# (matching lines with surrounding context) instead of in full
+DIFF_FULL_FILE_MAX_CHARS = int(os.environ.get("LLM_DIFF_FULL_FILE_CHARS", "16000"))
+DIFF_EXCERPT_CONTEXT_LINES = 20
+# Chunks read ahead and dispatched together; bounds how much source text is held at once
+CHUNK_WINDOW_SIZE = int(os.environ.get("LLM_CHUNK_WINDOW", "256"))
+# Request server-sent-event streaming completions (LLM_STREAM_RESPONSES=1)
+STREAM_LLM_RESPONSES = os.environ.get("LLM_STREAM_RESPONSES") == "1"
+# Write buffer for report files
+REPORT_WRITE_BUFFER_SIZE = 1024 * 1024
+# Application-level retries for throttled or transient LLM request failures
+LLM_MAX_RETRIES = 5
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+# Proactive provider quotas (requests and estimated prompt tokens per minute); 0 disables a limit
+LLM_MAX_REQUESTS_PER_MINUTE = int(os.environ.get("LLM_MAX_RPM", "0"))
+LLM_MAX_TOKENS_PER_MINUTE = int(os.environ.get("LLM_MAX_TPM", "0"))
+# On-disk cache for deterministic (temperature=0) LLM responses. Per-user rather than relative:
+# the server runs the scripts inside the analyzed checkout, which must not gain cache files
+LLM_CACHE_DIR = os.path.expanduser(os.environ.get("LLM_CACHE_DIR", os.path.join("~", ".cache", "repocloner", "llm")))
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_TTL_SECONDS = 7 * 86400
+
 # Parse command line arguments for AI configuration
 def parse_args():
     parser = argparse.ArgumentParser(description='AI-powered repository analysis for Kafka to Azure Service Bus migration')
@@ -26,12 +149,15 @@ def parse_args():
     parser.add_argument('--api-version', help='API version (optional)')
     parser.add_argument('--base-url', required=True, help='API endpoint URL')
     parser.add_argument('--api-key', required=True, help='AI API key (required)')
+    parser.add_argument('--use-batch-api', action='store_true', help='Send summarize and Kafka-scan prompts through the provider Batch API')
+    parser.add_argument('--no-prefilter', action='store_true', help='Send every chunk to the Kafka scan, not only chunks with a local Kafka hint')
     return parser.parse_args()
 
 class RepoAnalysisState(TypedDict):
     repo_url: str
     repo_path: str
-    code_chunks: List[str]
+    code_files: List[str]
+    code_chunks: "SharedChunkStream"
     messages: List[BaseMessage]
     analysis: str
     kafka_inventory: List[dict]
@@ -41,20 +167,194 @@ class RepoAnalysisState(TypedDict):
     api_version: str
     base_url: str
     api_key: str
+    use_batch_api: bool
+    kafka_prefilter: bool
+
+class LLMCache:
+    """
+    Exact-match response cache for temperature=0 calls, backed by SQLite.
+    Keys are SHA-256 digests of the full request payload and endpoint.
+    """
+
+    def __init__(self, cache_dir: str, ttl_seconds: int, enabled: bool = True):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.stats = {"hits": 0, "misses": 0}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(model: str, messages: List[dict], temperature: float, base_url: str) -> str:
+        payload = {"model": model, "messages": messages, "temperature": temperature, "base_url": base_url}
+        return hashlib.sha256(json_dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.cache_dir, "responses.sqlite3"), check_same_thread=False)
+            # WAL lets concurrent analysis processes read while one writes, and with
+            # synchronous=NORMAL each insert commits without an fsync
+            try:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            except sqlite3.Error:
+                pass
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            try:
+                row = self._connection().execute(
+                    "SELECT content FROM responses WHERE key = ? AND expires_at > ?", (key, time.time())
+                ).fetchone()
+            except sqlite3.Error:
+                row = None
+            self.stats["hits" if row else "misses"] += 1
+        return row[0] if row else None
+
+    def set(self, key: str, content: str, ttl: Optional[int] = None):
+        if not self.enabled:
+            return
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, content, expires_at) VALUES (?, ?, ?)",
+                    (key, content, time.time() + (ttl or self.ttl_seconds)),
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ LLM cache write failed: {e}")
+
+llm_cache = LLMCache(LLM_CACHE_DIR, LLM_CACHE_TTL_SECONDS, LLM_CACHE_ENABLED)
+
+class RateLimiter:
+    """
+    Token buckets for requests and tokens per minute, shared by every thread that
+    issues LLM calls, so throughput stays under the provider quota instead of
+    discovering it through 429s. Capacity refills continuously up to one minute's worth.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_capacity = float(requests_per_minute)
+        self._token_capacity = float(tokens_per_minute)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        if not self.requests_per_minute and not self.tokens_per_minute:
+            return
+        # A single call larger than the whole bucket would otherwise wait forever
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self._updated_at
+                self._updated_at = now
+                self._request_capacity = min(
+                    self.requests_per_minute, self._request_capacity + elapsed * self.requests_per_minute / 60
+                )
+                self._token_capacity = min(
+                    self.tokens_per_minute, self._token_capacity + elapsed * self.tokens_per_minute / 60
+                )
+
+                wait = 0.0
+                if self.requests_per_minute and self._request_capacity < 1:
+                    wait = (1 - self._request_capacity) * 60 / self.requests_per_minute
+                if self.tokens_per_minute and self._token_capacity < tokens:
+                    wait = max(wait, (tokens - self._token_capacity) * 60 / self.tokens_per_minute)
+                if not wait:
+                    self._request_capacity -= 1
+                    self._token_capacity -= tokens
+                    return
+            time.sleep(wait)
+
+rate_limiter = RateLimiter(LLM_MAX_REQUESTS_PER_MINUTE, LLM_MAX_TOKENS_PER_MINUTE)
+
+def redact_url(url: str) -> str:
+    """Mask credential-looking query parameters (api-key, sig, token...) before a URL is logged."""
+    parsed = urlparse(url)
+    if not parsed.query:
+        return url
+    params = parse_qs(parsed.query, keep_blank_values=True)
+    redacted = {
+        name: ["***"] if any(secret in name.lower() for secret in ("key", "sig", "token", "secret")) else values
+        for name, values in params.items()
+    }
+    return urlunparse(parsed._replace(query=urlencode(redacted, doseq=True, safe="*")))
+
+def redact_urls(text: str) -> str:
+    """Apply redact_url to every URL in free text, such as a requests exception message."""
+    return URL_WITH_QUERY_RE.sub(lambda match: redact_url(match.group()), text)
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return min(60.0, max(0.0, float(value)))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return min(60.0, max(0.0, retry_at.timestamp() - time.time()))
+
+def create_http_session() -> requests.Session:
+    """
+    Keep-alive session sized for concurrent LLM calls, so every request to the
+    endpoint reuses pooled connections instead of a fresh TCP+TLS handshake.
+    """
+    session = requests.Session()
+    # Only failures to connect are retried here, immediately: this runs inside the caller's
+    # request slot. Throttling and 5xx backoff belong to _post_with_backoff, which sleeps
+    # without holding a slot.
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=0,
+        status=0,
+        other=0,
+        backoff_factor=0,
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=LLM_MAX_INFLIGHT, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+# Shared by every model instance, so connections opened by one pipeline node stay
+# warm for the next instead of each node paying its own handshakes
+http_session = create_http_session()
+
+# LangChain message types mapped to chat-completions roles
+MESSAGE_ROLES = {"human": "user", "ai": "assistant", "system": "system"}
 
 class ApiKeyOnlyChatModel(BaseChatModel):
     model_name: str
     base_url: str
     api_key: str
     api_version: Optional[str] = None
+    stream_responses: bool = STREAM_LLM_RESPONSES
+    _session: requests.Session = PrivateAttr(default_factory=lambda: http_session)
 
-    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs):
-        role_map = {"human": "user", "ai": "assistant", "system": "system"}
-        
+    def _build_payload(self, messages: List[BaseMessage]) -> Dict[str, Any]:
         # For deployment-based URLs (Azure OpenAI, EPAM proxy), don't include model in payload
         payload = {
             "messages": [
-                {"role": role_map.get(m.type, m.type), "content": m.content}
+                {"role": MESSAGE_ROLES.get(m.type, m.type), "content": m.content}
                 for m in messages
             ],
             "temperature": 0,
@@ -63,7 +363,9 @@ class ApiKeyOnlyChatModel(BaseChatModel):
         # Only add model name for direct OpenAI API calls (not deployment-based URLs)
         if 'deployments' not in self.base_url.lower():
             payload["model"] = self.model_name
-        
+        return payload
+
+    def _build_headers(self) -> Dict[str, str]:
         # Use EPAM-specific Api-Key header format (not standard OpenAI Bearer token)
         if 'epam' in self.base_url.lower():
             headers = {"Content-Type": "application/json", "Api-Key": self.api_key}
@@ -80,39 +382,227 @@ class ApiKeyOnlyChatModel(BaseChatModel):
         if 'epam' in self.base_url.lower():
             # Add any additional headers needed for EPAM proxy
             headers["User-Agent"] = "RepoCloner-AI-Analysis/1.0"
+        return headers
+
+    def _cache_key(self, payload: Dict[str, Any]) -> str:
+        return llm_cache.cache_key(self.model_name, payload["messages"], payload["temperature"], self.base_url)
+
+    def _post_with_backoff(self, headers: Dict[str, str], payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        """
+        POST the payload, retrying throttled/transient failures with exponential
+        backoff and jitter, honoring Retry-After when the server sends one.
+        A request slot is only held while a POST is outstanding, never during backoff.
+        """
+        # Serialized once (with orjson when available) and reused across retries
+        body = json_dumps(payload).encode("utf-8")
+        # Rough prompt size: about four bytes of JSON per token
+        estimated_tokens = len(body) // 4
+        for attempt in range(LLM_MAX_RETRIES):
+            last_attempt = attempt == LLM_MAX_RETRIES - 1
+            rate_limiter.acquire(estimated_tokens)
+            try:
+                with LLM_REQUEST_SLOTS:
+                    resp = self._session.post(self.base_url, headers=headers, data=body, timeout=120, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if last_attempt:
+                    raise
+                delay = min(60, (2 ** attempt) + random.random())
+                print(f"⚠️ Request error ({redact_urls(str(e))}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if resp.status_code not in RETRYABLE_STATUS_CODES or last_attempt:
+                return resp
+            resp.close()
+
+            delay = retry_after_seconds(resp.headers.get("Retry-After"))
+            if delay is None:
+                delay = min(60, (2 ** attempt) + random.random())
+            print(f"⚠️ Received {resp.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+        return resp
+
+    @staticmethod
+    def _read_streamed_content(resp: requests.Response) -> str:
+        """Accumulate choices[0].delta.content from a server-sent-events completion stream."""
+        pieces = []
+        for line in resp.iter_lines():
+            if not line or not line.startswith(b"data:"):
+                continue
+            data = line[len(b"data:"):].strip()
+            if data == b"[DONE]":
+                break
+            # A frame that is not valid JSON aborts the call instead of waiting for the rest
+            frame = json_loads(data)
+            choices = frame.get("choices") or []
+            if choices:
+                delta = choices[0].get("delta") or {}
+                if delta.get("content"):
+                    pieces.append(delta["content"])
+        return "".join(pieces)
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs):
+        payload = self._build_payload(messages)
+        
+        # Deterministic calls are served from the response cache when possible
+        cache_key = self._cache_key(payload)
+        cached_content = llm_cache.get(cache_key)
+        if cached_content is not None:
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=cached_content))])
+        
+        headers = self._build_headers()
             
         try:
-            # For EPAM proxy, use the URL as-is since it already contains properly formatted parameters
-            print(f"🌐 Making API request to: {self.base_url}")
-            print(f"🔧 Headers: {{'Content-Type': 'application/json', 'Authorization': 'Bearer ***'}}")
-            print(f"📋 Payload: {payload}")
-            
-            resp = requests.post(self.base_url, headers=headers, json=payload, timeout=120)
+            # For EPAM proxy, use the URL as-is since it already contains properly formatted parameters.
+            # Calls run concurrently, so per-call details go to the debug logger instead of stdout
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Making API request to %s with payload %s", redact_url(self.base_url), payload)
             
-            print(f"🔍 Response Status: {resp.status_code}")
-            print(f"📄 Response Headers: ***")
+            if self.stream_responses:
+                payload = {**payload, "stream": True}
+            resp = self._post_with_backoff(headers, payload, stream=self.stream_responses)
+            logger.debug("Response status: %s", resp.status_code)
             
             if resp.status_code != 200:
                 print(f"❌ Error Response Body: {resp.text}")
                 resp.raise_for_status()
             
-            data = resp.json()
-            print(f"✅ Success! Response keys: {list(data.keys())}")
-            content = data["choices"][0]["message"]["content"]
+            if self.stream_responses:
+                # Tokens are consumed as they arrive rather than after the full body is buffered
+                with resp:
+                    content = self._read_streamed_content(resp)
+                logger.debug("Streamed %d characters", len(content))
+            else:
+                data = json_loads(resp.content)
+                content = data["choices"][0]["message"]["content"]
+            llm_cache.set(cache_key, content)
         except requests.exceptions.RequestException as e:
             error_details = f"Status: {getattr(e.response, 'status_code', 'Unknown')}, Response: {getattr(e.response, 'text', 'No response body')}"
-            raise Exception(f"API request failed: {e}. Details: {error_details}")
+            # The exception text includes the request URL, and with it any api-key query parameter
+            raise Exception(f"API request failed: {redact_urls(str(e))}. Details: {error_details}")
         except Exception as e:
-            print(f"❌ Unexpected error: {e}")
+            print(f"❌ Unexpected error: {redact_urls(str(e))}")
             raise
             
         ai_msg = AIMessage(content=content)
         return ChatResult(generations=[ChatGeneration(message=ai_msg)])
 
+    def supports_batch_api(self) -> bool:
+        # The Batch API lives next to /chat/completions on OpenAI-style endpoints only
+        base_url = self.base_url.lower()
+        return base_url.rstrip("/").endswith("/chat/completions") and 'deployments' not in base_url and 'epam' not in base_url
+
+    def submit_batch(self, prompts: List[str], poll_interval: int = 30) -> List[str]:
+        """
+        Run prompts through the OpenAI Batch API (/v1/files + /v1/batches) and
+        return the response contents in prompt order.
+        """
+        api_root = self.base_url.rstrip("/")[: -len("/chat/completions")]
+        auth_headers = {k: v for k, v in self._build_headers().items() if k != "Content-Type"}
+
+        lines = []
+        for idx, prompt in enumerate(prompts):
+            lines.append(json_dumps({
+                "custom_id": f"prompt-{idx}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self._build_payload([HumanMessage(content=prompt)]),
+            }))
+
+        upload = self._session.post(
+            f"{api_root}/files",
+            headers=auth_headers,
+            data={"purpose": "batch"},
+            files={"file": ("batch.jsonl", "\n".join(lines).encode("utf-8"), "application/jsonl")},
+            timeout=120,
+        )
+        upload.raise_for_status()
+
+        batch = self._session.post(
+            f"{api_root}/batches",
+            headers=auth_headers,
+            json={"input_file_id": json_loads(upload.content)["id"], "endpoint": "/v1/chat/completions", "completion_window": "24h"},
+            timeout=120,
+        )
+        batch.raise_for_status()
+        batch_info = json_loads(batch.content)
+        print(f"📦 Submitted batch {batch_info['id']} with {len(prompts)} prompts")
+
+        while batch_info["status"] not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(poll_interval)
+            status = self._session.get(f"{api_root}/batches/{batch_info['id']}", headers=auth_headers, timeout=120)
+            status.raise_for_status()
+            batch_info = json_loads(status.content)
+            print(f"⏳ Batch {batch_info['id']} status: {batch_info['status']}")
+
+        if batch_info["status"] != "completed" or not batch_info.get("output_file_id"):
+            raise Exception(f"Batch {batch_info['id']} finished with status {batch_info['status']}")
+
+        output = self._session.get(f"{api_root}/files/{batch_info['output_file_id']}/content", headers=auth_headers, timeout=120)
+        output.raise_for_status()
+
+        contents: Dict[str, str] = {}
+        for line in output.content.splitlines():
+            if not line.strip():
+                continue
+            record = json_loads(line)
+            body = (record.get("response") or {}).get("body") or {}
+            if body.get("choices"):
+                contents[record["custom_id"]] = body["choices"][0]["message"]["content"]
+
+        missing = [idx for idx in range(len(prompts)) if f"prompt-{idx}" not in contents]
+        if missing:
+            raise Exception(f"Batch {batch_info['id']} returned no result for {len(missing)} prompts")
+
+        results = [contents[f"prompt-{idx}"] for idx in range(len(prompts))]
+        for prompt, content in zip(prompts, results):
+            llm_cache.set(self._cache_key(self._build_payload([HumanMessage(content=prompt)])), content)
+        return results
+
     @property
     def _llm_type(self) -> str:
         return "api-key-only-chat"
 
+@lru_cache(maxsize=None)
+def chat_model(model_name: str, base_url: str, api_key: str, api_version: Optional[str]) -> ApiKeyOnlyChatModel:
+    """One model instance per endpoint configuration, shared by every node in the run."""
+    return ApiKeyOnlyChatModel(model_name=model_name, base_url=base_url, api_key=api_key, api_version=api_version)
+
+def chat_model_for_state(state: RepoAnalysisState) -> ApiKeyOnlyChatModel:
+    return chat_model(state['model'], state['base_url'], state['api_key'], state['api_version'])
+
+def invoke_prompts(llm: BaseChatModel, prompts: List[str], use_batch_api: bool = False) -> List[BaseMessage]:
+    """
+    Send independent prompts to the model concurrently.
+    Identical prompts are sent once; responses are returned in the same order as the prompts.
+    With use_batch_api, prompts go through the provider's Batch API and fall back
+    to concurrent calls if the batch cannot be completed.
+    """
+    if not prompts:
+        return []
+    unique_prompts: Dict[bytes, str] = {}
+    order = []
+    for prompt in prompts:
+        digest = hashlib.sha1(prompt.encode("utf-8")).digest()
+        if digest not in unique_prompts:
+            unique_prompts[digest] = prompt
+        order.append(digest)
+    if len(unique_prompts) < len(prompts):
+        print(f"♻️ Skipping {len(prompts) - len(unique_prompts)} duplicate prompts")
+    if use_batch_api and isinstance(llm, ApiKeyOnlyChatModel) and llm.supports_batch_api():
+        try:
+            contents = llm.submit_batch(list(unique_prompts.values()))
+            results_by_hash = {digest: AIMessage(content=content) for digest, content in zip(unique_prompts.keys(), contents)}
+            return [results_by_hash[digest] for digest in order]
+        except Exception as e:
+            print(f"⚠️ Batch API unavailable ({redact_urls(str(e))}), falling back to concurrent requests")
+    responses = llm.batch(
+        [[HumanMessage(content=prompt)] for prompt in unique_prompts.values()],
+        config={"max_concurrency": MAX_LLM_CONCURRENCY},
+    )
+    results_by_hash = dict(zip(unique_prompts.keys(), responses))
+    return [results_by_hash[digest] for digest in order]
+
 def clone_repo(state: RepoAnalysisState):
     repo_url = state["repo_url"]
     local_path = state["repo_path"]
@@ -122,114 +612,431 @@ def clone_repo(state: RepoAnalysisState):
         print(f"Repository files already exist at {local_path} (cloned by main application)")
         return state
     
-    if os.path.exists(os.path.join(local_path, ".git")):
-        print(f"Repository already exists at {local_path}, checking for updates...")
+    print(f"Cloning repository into {local_path}...")
+    os.makedirs(local_path, exist_ok=True)
+    # Single-commit partial clone: no history, tags or other branches. Submodules are not
+    # cloned (their code is not the user's to migrate); if initialised later they stay shallow
+    subprocess.run(
+        [
+            "git", "-c", "protocol.version=2", "clone",
+            "--depth", "1", "--filter=blob:none", "--single-branch", "--no-tags",
+            "--shallow-submodules",
+            repo_url, local_path,
+        ],
+        check=True
+    )
 
-        remote_commit = subprocess.check_output(
-            ["git", "ls-remote", repo_url, "HEAD"]
-        ).decode().split()[0]
+    return state
 
-        local_commit = subprocess.check_output(
-            ["git", "rev-parse", "HEAD"],
-            cwd=local_path
-        ).decode().strip()
+def list_repo_files(repo_path: str) -> List[str]:
+    """
+    Relative paths of all files under repo_path, skipping .git and symlinked directories.
+    Same top-down order as os.walk, but driven by scandir so entry types come from the directory read.
+    """
+    files = []
+    # Every entry path starts with `root`, so relative paths are a slice instead of os.path.relpath
+    root = os.path.join(repo_path, "")
+    root_len = len(root)
+    pending_dirs = [root]
+    while pending_dirs:
+        current = pending_dirs.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if entry.name != ".git" and not entry.is_symlink():
+                    subdirs.append(entry.path)
+            else:
+                files.append(entry.path[root_len:])
+        pending_dirs.extend(reversed(subdirs))
+    return files
 
-        if local_commit == remote_commit:
-            print("Local repository is already up-to-date with origin.")
-        else:
-            print("Local repo is outdated, pulling latest changes...")
-            subprocess.run(["git", "pull"], cwd=local_path, check=True)
-    else:
-        print(f"Cloning repository into {local_path}...")
-        os.makedirs(local_path, exist_ok=True)
-        subprocess.run(["git", "clone", "--depth", "1", repo_url, local_path], check=True)
+def get_updated_state_with_code_chunks(state: RepoAnalysisState) -> RepoAnalysisState:
+    """
+    Collect the candidate files to analyze. Only relative paths are kept in state;
+    chunks are read lazily, once, into a stream both analysis branches consume.
+    """
+    code_files = []
+    for file_rel in list_repo_files(state["repo_path"]):
+        # One set lookup on the lowercased extension instead of lowercasing the path
+        _, dot, extension = file_rel.rpartition(".")
+        if not (dot and extension.lower() in EXCLUDED_EXTENSIONS):
+            code_files.append(file_rel)
 
-    return state
+    print(f"📊 Total files loaded: {len(code_files)}")
+    print(f"🔍 Phase 2: Starting AI-powered analysis...")
+    code_chunks = SharedChunkStream(
+        state["repo_path"], code_files, ("analyze_code", "scan_for_kafka_usage_ai"), CHUNK_WINDOW_SIZE * 2
+    )
+    return {**state, "code_files": code_files, "code_chunks": code_chunks}
 
-def get_updated_state_with_code_chunks(state: RepoAnalysisState) -> RepoAnalysisState:
-    repo_path = state["repo_path"]
+def read_file_chunks(repo_path: str, file_rel: str) -> List[str]:
+    """
+    Read one file as "File: <path>" prefixed chunks.
+    Binary files (NUL byte in the first 1KB) are skipped using the same open handle.
+    """
     chunks = []
-    EXCLUDED_EXTENSIONS = (".png", ".jpg", ".exe", ".dll", ".bin")
-
-    max_chunk_size = 4000
-    for root, dirs, files in os.walk(repo_path):
-        if ".git" in dirs:
-            dirs.remove(".git")
-        for f in files:
-            path = os.path.join(root, f)
-            if f.lower().endswith(EXCLUDED_EXTENSIONS):
-                continue
-            try:
-                with open(path, "rb") as test_fp:
-                    start = test_fp.read(1024)
-                    if b'\0' in start:
+    try:
+        with open(os.path.join(repo_path, file_rel), "rb") as raw:
+            if hasattr(os, "posix_fadvise"):
+                # The file is read front to back once, so let the kernel read ahead aggressively
+                try:
+                    os.posix_fadvise(raw.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                except OSError:
+                    pass
+            if b'\0' in raw.read(1024):
+                return chunks
+            raw.seek(0)
+            header = f"File: {file_rel}\n"
+            # Decoded incrementally, one chunk-sized read at a time, so the whole file is never held twice.
+            # Full chunks end at the last line break they contain, so the model never sees a torn
+            # identifier; the remainder is carried into the next chunk.
+            carry = ""
+            with io.TextIOWrapper(raw, encoding="utf-8", errors="ignore") as fp:
+                while text := carry + fp.read(MAX_CHUNK_SIZE - len(carry)):
+                    carry = ""
+                    if len(text) == MAX_CHUNK_SIZE:
+                        cut = text.rfind("\n") + 1
+                        if cut:
+                            text, carry = text[:cut], text[cut:]
+                    chunks.append(header + text)
+    except (IOError, OSError):
+        pass
+    return chunks
+
+def iter_code_chunks(repo_path: str, code_files: List[str]) -> Iterator[str]:
+    """
+    Yield chunks for every file in order, reading a bounded number of files
+    ahead on a thread pool so disk reads overlap.
+    """
+    with ThreadPoolExecutor(max_workers=FILE_READ_WORKERS) as executor:
+        pending = deque()
+        files = iter(code_files)
+        for file_rel in islice(files, FILE_READ_WORKERS * 2):
+            pending.append(executor.submit(read_file_chunks, repo_path, file_rel))
+        while pending:
+            chunks = pending.popleft().result()
+            next_file = next(files, None)
+            if next_file is not None:
+                pending.append(executor.submit(read_file_chunks, repo_path, next_file))
+            yield from chunks
+
+class SharedChunkStream:
+    """
+    One pass of iter_code_chunks shared by the named consumers, so each file is read once.
+    Every consumer sees all chunks in order; a chunk is dropped once all consumers are past it,
+    and a consumer more than `max_ahead` chunks ahead of the slowest waits for it to catch up.
+    """
+
+    def __init__(self, repo_path: str, code_files: List[str], consumers: Iterable[str], max_ahead: int):
+        self._source = iter_code_chunks(repo_path, code_files)
+        self._buffer: deque = deque()
+        self._base = 0  # stream index of self._buffer[0]
+        self._positions = dict.fromkeys(consumers, 0)
+        self._max_ahead = max_ahead
+        self._reading = False
+        self._exhausted = False
+        self._cond = threading.Condition()
+
+    def _drop_consumed(self):
+        if not self._positions:
+            self._buffer.clear()
+            return
+        slowest = min(self._positions.values())
+        while self._buffer and self._base < slowest:
+            self._buffer.popleft()
+            self._base += 1
+
+    def iter(self, consumer: str) -> Iterator[str]:
+        try:
+            while True:
+                with self._cond:
+                    pos = self._positions[consumer]
+                    if pos < self._base + len(self._buffer):
+                        chunk = self._buffer[pos - self._base]
+                        self._positions[consumer] = pos + 1
+                        self._drop_consumed()
+                        self._cond.notify_all()
+                    elif self._exhausted:
+                        return
+                    elif self._reading or pos - min(self._positions.values()) >= self._max_ahead:
+                        self._cond.wait()
                         continue
-                with open(path, "r", encoding="utf-8", errors="ignore") as fp:
-                    content = fp.read()
-                    for i in range(0, len(content), max_chunk_size):
-                        chunk = content[i:i+max_chunk_size]
-                        chunks.append(f"File: {os.path.relpath(path, repo_path)}\n{chunk}")
-            except (IOError, OSError):
-                continue
+                    else:
+                        # Read outside the lock so other consumers keep draining the buffer
+                        self._reading = True
+                        chunk = None
+                if chunk is not None:
+                    yield chunk
+                    continue
+                try:
+                    chunk = next(self._source, None)
+                finally:
+                    with self._cond:
+                        self._reading = False
+                        if chunk is None:
+                            self._exhausted = True
+                        else:
+                            self._buffer.append(chunk)
+                        self._cond.notify_all()
+        finally:
+            # A finished or failed consumer no longer holds chunks back or paces the others
+            with self._cond:
+                self._positions.pop(consumer, None)
+                self._drop_consumed()
+                self._cond.notify_all()
+                if not self._positions:
+                    self._source.close()
 
-    print(f"📊 Total chunks loaded: {len(chunks)}")
-    print(f"🔍 Phase 2: Starting AI-powered analysis...")
-    return {**state, "code_chunks": chunks}
+def iter_packs(chunks: List[str], max_items: int, max_chars: int) -> Iterator[List[int]]:
+    """
+    Group chunk indexes into packs of at most `max_items` chunks and roughly
+    `max_chars` characters; a chunk that alone exceeds the budget gets its own pack.
+    """
+    pack: List[int] = []
+    size = 0
+    for idx, chunk in enumerate(chunks):
+        if pack and (len(pack) == max_items or size + len(chunk) > max_chars):
+            yield pack
+            pack, size = [], 0
+        pack.append(idx)
+        size += len(chunk)
+    if pack:
+        yield pack
+
+def iter_windows(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    """Group a stream into lists of at most `size` items."""
+    iterator = iter(items)
+    while window := list(islice(iterator, size)):
+        yield window
+
+def parse_summary_pack(text: str, size: int) -> Optional[List[str]]:
+    # Returns None unless the reply is one string per chunk, so the pack can be retried chunk by chunk
+    items = find_json(text, "[")
+    if not isinstance(items, list) or len(items) != size or not all(isinstance(item, str) for item in items):
+        return None
+    return items
+
+def chunk_body_digest(chunk: str) -> bytes:
+    """Digest of a chunk's code, ignoring the "File: <path>" header line."""
+    return hashlib.blake2b(chunk[chunk.find("\n") + 1:].encode("utf-8"), digest_size=16).digest()
 
 def analyze_code(state: RepoAnalysisState):
-    llm = ApiKeyOnlyChatModel(
-        model_name=state['model'], 
-        base_url=state['base_url'], 
-        api_key=state['api_key'],
-        api_version=state['api_version']
-    )
+    llm = chat_model_for_state(state)
+    use_batch_api = state.get("use_batch_api", False)
     summaries = []
-    for chunk in state["code_chunks"]:
-        prompt = f"Summarize the purpose and functionality of this code:\n\n{chunk}"
-        resp = llm.invoke([HumanMessage(content=prompt)])
-        summaries.append(resp.content)
+    # Identical chunk bodies are summarized once; repeats reuse the first summary
+    summary_by_body: Dict[bytes, str] = {}
+    chunks = state["code_chunks"].iter("analyze_code")
+    for window in iter_windows(chunks, CHUNK_WINDOW_SIZE):
+        digests = [chunk_body_digest(chunk) for chunk in window]
+        to_summarize: Dict[bytes, str] = {}
+        for digest, chunk in zip(digests, window):
+            if digest not in summary_by_body and digest not in to_summarize:
+                to_summarize[digest] = chunk
+        unique = list(to_summarize.values())
+
+        # Several chunks share one request; packs whose reply cannot be split are summarized chunk by chunk
+        packs = [[unique[i] for i in pack] for pack in iter_packs(unique, SCAN_CHUNKS_PER_REQUEST, PACK_MAX_CHARS)]
+        responses = invoke_prompts(llm, [SUMMARIZE_PACK_PROMPT + pack_chunks(pack) for pack in packs], use_batch_api)
+        pack_summaries = [parse_summary_pack(resp.content, len(pack)) for pack, resp in zip(packs, responses)]
+
+        retry_chunks = [chunk for pack, result in zip(packs, pack_summaries) if result is None for chunk in pack]
+        retried = iter(resp.content for resp in invoke_prompts(llm, [SUMMARIZE_PROMPT + chunk for chunk in retry_chunks], use_batch_api))
+        unique_summaries = []
+        for pack, result in zip(packs, pack_summaries):
+            unique_summaries.extend(result if result is not None else islice(retried, len(pack)))
+
+        summary_by_body.update(zip(to_summarize, unique_summaries))
+        summaries.extend(summary_by_body[digest] for digest in digests)
 
     analysis = "\n\n".join(summaries)
-    return {**state, "analysis": analysis}
+    # Runs in parallel with scan_for_kafka_usage_ai, so only this node's key is returned
+    return {"analysis": analysis}
 
-def scan_for_kafka_usage_ai(state: RepoAnalysisState) -> RepoAnalysisState:
-    llm = ApiKeyOnlyChatModel(
-        model_name=state['model'], 
-        base_url=state['base_url'], 
-        api_key=state['api_key'],
-        api_version=state['api_version']
+def kafka_scan_prompt(chunk: str) -> str:
+    return KAFKA_SCAN_PROMPT + chunk
+
+def pack_chunks(chunks: List[str]) -> str:
+    return "\n".join(
+        f"<<<CHUNK id={idx}>>>\n{chunk}\n<<<END>>>" for idx, chunk in enumerate(chunks)
     )
-    inventory: List[Dict[str, Any]] = []
-    code_chunks = state["code_chunks"]
-
-    print(f"Scanning {len(code_chunks)} chunks for Kafka usage via AI...")
-
-    for idx, chunk in enumerate(code_chunks):
-        prompt = (
-            "You are analyzing a .NET Core repository. "
-            "Does this code use Kafka (e.g., Confluent.Kafka, Kafka APIs, producers, consumers, topics, partitions)? "
-            "If yes, return a JSON object with fields: "
-            "{'file': 'relative/path', 'kafka_apis': [...], 'summary': '...'}.\n"
-            "If not, return {}.\n\n"
-            f"Code chunk:\n{chunk}"
-        )
-        resp = llm.invoke([HumanMessage(content=prompt)])
-        text = getattr(resp, "content", "") or str(resp)
 
-        match = re.search(r"\{.*\}", text, flags=re.S)
-        if match:
-            try:
-                data = json.loads(match.group(0))
-                if data and "file" in data:
-                    inventory.append(data)
-            except Exception:
-                pass
+def kafka_scan_pack_prompt(chunks: List[str]) -> str:
+    return KAFKA_SCAN_PACK_PROMPT + pack_chunks(chunks)
+
+def extract_json_span(text: str, start: int) -> Optional[str]:
+    """
+    Return the balanced JSON object/array starting at text[start], or None.
+    Walks only the structural characters, honoring string literals and escapes.
+    """
+    opener = text[start]
+    closer = "}" if opener == "{" else "]"
+    depth = 0
+    in_string = False
+    escaped_pos = -1
+    for match in JSON_TOKEN_RE.finditer(text, start):
+        pos = match.start()
+        char = match.group()
+        if in_string:
+            if pos == escaped_pos:
+                continue
+            if char == "\\":
+                escaped_pos = pos + 1
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == opener:
+            depth += 1
+        elif char == closer:
+            depth -= 1
+            if depth == 0:
+                return text[start:pos + 1]
+    return None
+
+def find_json(text: str, opener: str = "{") -> Any:
+    """Parse the first balanced JSON value opened by `opener` in a model reply."""
+    start = text.find(opener)
+    while start != -1:
+        span = extract_json_span(text, start)
+        if span is None:
+            return None
+        try:
+            return json_loads(span)
+        except ValueError:
+            start = text.find(opener, start + 1)
+    return None
+
+def parse_kafka_scan_result(text: str) -> Optional[Dict[str, Any]]:
+    data = find_json(text, "{")
+    if isinstance(data, dict) and data and "file" in data:
+        return data
+    return None
+
+def parse_kafka_scan_pack(text: str, size: int) -> Optional[List[Optional[Dict[str, Any]]]]:
+    # Returns None when the reply is not a usable array, so the pack can be retried chunk by chunk
+    items = find_json(text, "[")
+    if not isinstance(items, list) or len(items) != size:
+        return None
+    results = []
+    for item in items:
+        if isinstance(item, dict) and item.get("file"):
+            item.pop("id", None)
+            results.append(item)
+        else:
+            results.append(None)
+    return results
+
+def scan_for_kafka_usage_ai(state: RepoAnalysisState) -> RepoAnalysisState:
+    llm = chat_model_for_state(state)
+    # One inventory entry per file; APIs reported by later chunks of the same file are
+    # merged into insertion-ordered key sets as they arrive instead of repeating the row
+    inventory_by_file: Dict[str, Dict[str, Any]] = {}
+    apis_by_file: Dict[str, Dict[str, None]] = {}
+
+    def add_inventory_entry(data: Dict[str, Any]):
+        file_key = str(data["file"])
+        apis = data.get("kafka_apis")
+        if file_key not in inventory_by_file:
+            inventory_by_file[file_key] = data
+            apis_by_file[file_key] = {}
+        if isinstance(apis, list):
+            apis_by_file[file_key].update(dict.fromkeys(str(api) for api in apis))
+
+    code_files = state["code_files"]
+    use_batch_api = state.get("use_batch_api", False)
+    prefilter = state.get("kafka_prefilter", True)
+
+    print(f"Scanning {len(code_files)} files for Kafka usage via AI...")
+
+    # Identical chunk bodies (vendored, generated or boilerplate code) are scanned once:
+    # results are keyed by a digest of the body, without the per-file header
+    results_by_body: Dict[bytes, Optional[Dict[str, Any]]] = {}
+    reported_bodies = set()
+
+    idx = 0
+    skipped = 0
+    duplicates = 0
+    chunks = state["code_chunks"].iter("scan_for_kafka_usage_ai")
+    for window in iter_windows(chunks, CHUNK_WINDOW_SIZE):
+        # Only chunks with a Kafka hint are worth an LLM round-trip
+        candidates = [chunk for chunk in window if KAFKA_HINTS_RE.search(chunk)] if prefilter else window
+        skipped += len(window) - len(candidates)
+
+        digests = [chunk_body_digest(chunk) for chunk in candidates]
+        to_scan: Dict[bytes, str] = {}
+        for digest, chunk in zip(digests, candidates):
+            if digest not in results_by_body and digest not in to_scan:
+                to_scan[digest] = chunk
+        duplicates += len(candidates) - len(to_scan)
+
+        # Pack several chunks per request so the fixed instructions are sent once per pack
+        scan_items = list(to_scan.items())
+        packs = [
+            [scan_items[i] for i in pack]
+            for pack in iter_packs([chunk for _, chunk in scan_items], SCAN_CHUNKS_PER_REQUEST, PACK_MAX_CHARS)
+        ]
+        responses = invoke_prompts(llm, [kafka_scan_pack_prompt([chunk for _, chunk in pack]) for pack in packs], use_batch_api)
+
+        retry_items = []
+        for pack, resp in zip(packs, responses):
+            text = getattr(resp, "content", "") or str(resp)
+            results = parse_kafka_scan_pack(text, len(pack))
+            if results is None:
+                retry_items.extend(pack)
+                continue
+            for (digest, _), data in zip(pack, results):
+                results_by_body[digest] = data
+
+        if retry_items:
+            print(f"⚠️ Rescanning {len(retry_items)} chunks individually after unparseable packed replies")
+            unparsed = 0
+            responses = invoke_prompts(llm, [kafka_scan_prompt(chunk) for _, chunk in retry_items], use_batch_api)
+            for (digest, _), resp in zip(retry_items, responses):
+                text = getattr(resp, "content", "") or str(resp)
+                results_by_body[digest] = parse_kafka_scan_result(text)
+                if results_by_body[digest] is None and find_json(text, "{") is None:
+                    # An empty {} means "no Kafka"; a reply without any JSON object is lost data
+                    unparsed += 1
+            if unparsed:
+                print(f"⚠️ Dropped {unparsed} Kafka-scan replies that contained no JSON object")
+
+        # Recorded in chunk order; repeats of an already reported body are attributed to their own file
+        for digest, chunk in zip(digests, candidates):
+            data = results_by_body.get(digest)
+            if not data:
+                continue
+            if digest in reported_bodies:
+                data = {**data, "file": chunk[len("File: "):chunk.index("\n")]}
+            reported_bodies.add(digest)
+            add_inventory_entry(data)
 
-        if idx % 20 == 0:
-            print(f"Processed {idx}/{len(code_chunks)} chunks")
+        for _ in window:
+            if idx % 20 == 0:
+                print(f"Processed {idx} chunks")
+            idx += 1
 
+    inventory: List[Dict[str, Any]] = []
+    for file_key, entry in inventory_by_file.items():
+        if isinstance(entry.get("kafka_apis"), list):
+            entry["kafka_apis"] = list(apis_by_file[file_key])
+        inventory.append(entry)
+
+    print(f"Skipped {skipped} chunks without Kafka hints.")
+    if duplicates:
+        print(f"Reused scan results for {duplicates} duplicate chunks.")
     print(f"AI-identified Kafka usage in {len(inventory)} files.")
-    return {**state, "kafka_inventory": inventory}
+    # Runs in parallel with analyze_code, so only this node's key is returned
+    return {"kafka_inventory": inventory}
 
 # Static analysis fallback implemented - reports generated even when AI fails
 
@@ -241,7 +1048,7 @@ def extract_description_and_diff(raw: str) -> tuple[str, str]:
     s = raw.strip()
     
     # Find all fenced code blocks
-    fenced_blocks = list(re.finditer(r"```(\w+)?\s*\n([\s\S]*?)\n```", s, re.I))
+    fenced_blocks = list(FENCED_BLOCK_RE.finditer(s))
     
     # Look for diff/patch blocks first
     for match in fenced_blocks:
@@ -250,44 +1057,68 @@ def extract_description_and_diff(raw: str) -> tuple[str, str]:
         
         # Check if this is a diff block by language or content
         if (language.lower() in ["diff", "patch"] or 
-            re.search(r"^(diff --git|---\s|\+\+\+\s|@@)", content, re.M)):
+            DIFF_CONTENT_RE.search(content)):
             description = s[:match.start()].strip()
             return description, content
     
-    # If no suitable fenced block, look for diff markers with stronger validation
-    lines = s.splitlines()
-    diff_start = None
-    
-    for i, line in enumerate(lines):
-        # Only treat as diff start if we see proper diff headers
-        if re.match(r"^(diff --git|index\s|---\s[^\-]|\+\+\+\s[^\+])", line):
-            diff_start = i
-            break
-        # Look for hunk headers
-        elif re.match(r"^@@\s", line):
-            diff_start = i
-            break
+    # If no suitable fenced block, look for diff markers with stronger validation.
+    # Normalize unusual line breaks to \n first so one multiline scan finds the first
+    # line that starts with a proper diff header or a hunk header.
+    text = "\n".join(s.splitlines()) if OTHER_LINE_BREAK_RE.search(s) else s
+    diff_start = DIFF_START_RE.search(text)
     
     # If we found a proper diff start, split there
-    if diff_start is not None:
-        description = "\n".join(lines[:diff_start]).strip()
-        diff_content = "\n".join(lines[diff_start:]).strip()
+    if diff_start:
+        description = text[:diff_start.start()].strip()
+        diff_content = text[diff_start.start():].strip()
         return description, diff_content
     
     # If no diff markers found, treat entire response as description
     return s, ""
 
+def kafka_excerpts(content: str) -> Optional[str]:
+    """
+    Kafka-related regions of a file: each line matching KAFKA_HINTS_RE with
+    DIFF_EXCERPT_CONTEXT_LINES of context on both sides, overlapping regions merged,
+    each labeled with its 1-based line range. Returns None when nothing matches.
+    """
+    lines = content.splitlines(keepends=True)
+    ranges: List[List[int]] = []
+    for number, line in enumerate(lines):
+        if not KAFKA_HINTS_RE.search(line):
+            continue
+        start = max(0, number - DIFF_EXCERPT_CONTEXT_LINES)
+        end = min(len(lines), number + DIFF_EXCERPT_CONTEXT_LINES + 1)
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    if not ranges:
+        return None
+
+    blocks = []
+    for start, end in ranges:
+        block = "".join(lines[start:end])
+        if not block.endswith("\n"):
+            block += "\n"
+        blocks.append(f"// lines {start + 1}-{end}\n{block}")
+    return "".join(blocks)
+
+def code_diff_prompt(file_rel: str, file_content: str) -> str:
+    # Long files only carry their Kafka-related regions, which is all the diff touches
+    if len(file_content) > DIFF_FULL_FILE_MAX_CHARS:
+        excerpts = kafka_excerpts(file_content)
+        if excerpts is not None:
+            return f"{CODE_DIFF_PROMPT}File: {file_rel}\n\nOriginal code (Kafka-related excerpts):\n{excerpts}\n"
+    return f"{CODE_DIFF_PROMPT}File: {file_rel}\n\nOriginal code:\n{file_content}\n"
+
 def generate_code_diffs(state: RepoAnalysisState) -> RepoAnalysisState:
-    llm = ApiKeyOnlyChatModel(
-        model_name=state['model'], 
-        base_url=state['base_url'], 
-        api_key=state['api_key'],
-        api_version=state['api_version']
-    )
+    llm = chat_model_for_state(state)
     inventory = state.get("kafka_inventory", [])
     repo_path = state["repo_path"]
 
-    diffs = []
+    targets = []
+    prompts = []
     for item in inventory:
         file_rel = item.get("file")
         if not file_rel:
@@ -303,22 +1134,11 @@ def generate_code_diffs(state: RepoAnalysisState) -> RepoAnalysisState:
         except Exception:
             continue
 
-        prompt = f"""
-        You are a .NET Core expert.
-        File: {file_rel}
-
-        Original code:
-        {file_content}
-
+        targets.append(file_rel)
+        prompts.append(code_diff_prompt(file_rel, file_content))
 
-        Task:
-        - Show a unified diff patch (`diff` style) that replaces Kafka usage with Azure.Messaging.ServiceBus.
-        - Cover producers, consumers, config, and error handling.
-        - Keep namespaces, classes, and non-Kafka code intact.
-        - If no Kafka usage is present, return an empty diff.
-        """
-        resp = llm.invoke([HumanMessage(content=prompt)])
-        
+    diffs = []
+    for file_rel, resp in zip(targets, invoke_prompts(llm, prompts)):
         # Extract description and diff content separately
         content = resp.content if isinstance(resp.content, str) else str(resp.content)
         description, diff_content = extract_description_and_diff(content)
@@ -340,26 +1160,25 @@ def generate_report_streaming(state: RepoAnalysisState, report_path="migration-r
     Writes each section to disk incrementally instead of building one huge prompt.
     """
 
-    llm = ApiKeyOnlyChatModel(
-        model_name=state['model'], 
-        base_url=state['base_url'], 
-        api_key=state['api_key']
-    )
-
     # Use report_path from state if provided, otherwise use default parameter
     actual_report_path = state.get('report_path', report_path)
 
-    with open(actual_report_path, "w", encoding="utf-8") as f:
+    # A large write buffer lets the many small section writes reach disk in a few syscalls
+    with open(actual_report_path, "w", encoding="utf-8", buffering=REPORT_WRITE_BUFFER_SIZE) as f:
         # Header
         f.write("# Kafka → Azure Service Bus Migration Report\n\n")
 
         # 1. Kafka Usage Inventory
         inventory = state.get("kafka_inventory", [])
-        f.write("## 1. Kafka Usage Inventory\n\n")
-        f.write("| File | APIs Used | Summary |\n")
-        f.write("|------|-----------|---------|\n")
-        for item in inventory:
-            f.write(f"| {item.get('file')} | {', '.join(item.get('kafka_apis', []))} | {item.get('summary', '')} |\n")
+        f.write(
+            "## 1. Kafka Usage Inventory\n\n"
+            "| File | APIs Used | Summary |\n"
+            "|------|-----------|---------|\n"
+        )
+        f.write("".join(
+            f"| {item.get('file')} | {', '.join(item.get('kafka_apis', []))} | {item.get('summary', '')} |\n"
+            for item in inventory
+        ))
         f.write("\n")
 
         # 2. Code Migration Diffs (all files, no token explosion)
@@ -374,19 +1193,18 @@ def generate_report_streaming(state: RepoAnalysisState, report_path="migration-r
             if file_name.lower() == "readme.md":
                 continue
 
-            f.write(f"### {file_name}\n")
+            parts = [f"### {file_name}\n"]
             
             # Write description above the code block if it exists
             if description:
-                f.write(f"{description}\n\n")
+                parts.append(f"{description}\n\n")
             
             # Only write diff block if there's actual diff content
             if file_diff:
-                f.write("```diff\n")
-                f.write(file_diff.strip() + "\n")
-                f.write("```\n\n")
+                parts.append(f"```diff\n{file_diff.strip()}\n```\n\n")
             else:
-                f.write("*No diff content generated*\n\n")
+                parts.append("*No diff content generated*\n\n")
+            f.write("".join(parts))
 
 
     print(f"✅ Streaming migration report written to {actual_report_path}")
@@ -405,9 +1223,11 @@ graph.add_node("generate_report", generate_report_streaming)
 
 graph.set_entry_point("clone_repo")
 graph.add_edge("clone_repo", "load_source_code")
+# Summarizing and Kafka scanning both only read the loaded files, so they fan out
+# in parallel and generate_code_diffs joins once both have finished
 graph.add_edge("load_source_code", "analyze_code")
-graph.add_edge("analyze_code", "scan_for_kafka_usage_ai")
-graph.add_edge("scan_for_kafka_usage_ai", "generate_code_diffs")
+graph.add_edge("load_source_code", "scan_for_kafka_usage_ai")
+graph.add_edge(["analyze_code", "scan_for_kafka_usage_ai"], "generate_code_diffs")
 graph.add_edge("generate_code_diffs", "generate_report")
 graph.add_edge("generate_report", END)
 
@@ -430,7 +1250,7 @@ if __name__ == "__main__":
     print(f"📂 Repository Path: {args.repo_path}")
     print(f"🤖 Using Model: {args.model}")
     print(f"🔧 Using API Version: {args.api_version}")
-    print(f"🌐 Using Endpoint: {args.base_url}")
+    print(f"🌐 Using Endpoint: {redact_url(args.base_url)}")
     print(f"📊 Phase 1: Repository validation and code loading...")
     
     report_generated = False
@@ -444,7 +1264,7 @@ if __name__ == "__main__":
                 "repo_url": args.repo_url,
                 "repo_path": args.repo_path,
                 "report_path": report_path,
-                "code_chunks": [],
+                "code_files": [],
                 "analysis": "",
                 "kafka_inventory": [],
                 "code_diffs": [],
@@ -453,16 +1273,19 @@ if __name__ == "__main__":
                 "model": args.model,
                 "api_version": args.api_version,
                 "base_url": args.base_url,
-                "api_key": args.api_key
+                "api_key": args.api_key,
+                "use_batch_api": args.use_batch_api,
+                "kafka_prefilter": not args.no_prefilter
             })
             
             print("\n✅ AI Migration analysis completed!")
+            print(f"🗄️ LLM cache: {llm_cache.stats['hits']} hits, {llm_cache.stats['misses']} misses")
             print(f"📄 REPORT_GENERATED: {report_filename}")
             analysis_type = "AI Analysis"
             report_generated = True
         
         except Exception as e:
-            print(f"\n❌ AI Analysis failed: {str(e)}")
+            print(f"\n❌ AI Analysis failed: {redact_urls(str(e))}")
             print("🔄 Falling back to static analysis...")
     else:
         print("⚠️ No AI credentials provided, using static analysis")
@@ -476,33 +1299,29 @@ if __name__ == "__main__":
             code_diffs = []
             
             # Find files that likely contain Kafka usage
-            for root, dirs, files in os.walk(args.repo_path):
-                if ".git" in dirs:
-                    dirs.remove(".git")
-                for file in files:
-                    if file.endswith(('.cs', '.java', '.js', '.ts', '.py')):
-                        file_path = os.path.join(root, file)
-                        try:
-                            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                                content = f.read()
-                                if any(keyword.lower() in content.lower() for keyword in ['kafka', 'producer', 'consumer', 'confluent']):
-                                    relative_path = os.path.relpath(file_path, args.repo_path)
-                                    kafka_files.append({
-                                        'file': relative_path,
-                                        'kafka_apis': ['Kafka Producer', 'Kafka Consumer', 'Confluent.Kafka'],
-                                        'summary': 'Kafka usage detected in static analysis'
-                                    })
-                                    code_diffs.append({
-                                        'file': relative_path,
-                                        'diff_content': f'''- // Original Kafka implementation\n+ // Recommended Azure Service Bus migration:\n+ using Azure.Messaging.ServiceBus;\n+ // Replace Kafka producers with ServiceBusClient\n+ // Replace Kafka consumers with ServiceBusReceiver\n+ // Update configuration to use Service Bus connection strings''',
-                                        'description': 'Static analysis detected Kafka usage - recommended Azure Service Bus migration',
-                                        'language': 'diff'
-                                    })
-                        except Exception:
-                            continue
+            for relative_path in list_repo_files(args.repo_path):
+                if relative_path.endswith(('.cs', '.java', '.js', '.ts', '.py')):
+                    file_path = os.path.join(args.repo_path, relative_path)
+                    try:
+                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                            content = f.read()
+                            if STATIC_KAFKA_KEYWORDS_RE.search(content):
+                                kafka_files.append({
+                                    'file': relative_path,
+                                    'kafka_apis': ['Kafka Producer', 'Kafka Consumer', 'Confluent.Kafka'],
+                                    'summary': 'Kafka usage detected in static analysis'
+                                })
+                                code_diffs.append({
+                                    'file': relative_path,
+                                    'diff_content': f'''- // Original Kafka implementation\n+ // Recommended Azure Service Bus migration:\n+ using Azure.Messaging.ServiceBus;\n+ // Replace Kafka producers with ServiceBusClient\n+ // Replace Kafka consumers with ServiceBusReceiver\n+ // Update configuration to use Service Bus connection strings''',
+                                    'description': 'Static analysis detected Kafka usage - recommended Azure Service Bus migration',
+                                    'language': 'diff'
+                                })
+                    except Exception:
+                        continue
             
             # Generate static migration report
-            with open(report_path, "w", encoding="utf-8") as f:
+            with open(report_path, "w", encoding="utf-8", buffering=REPORT_WRITE_BUFFER_SIZE) as f:
                 f.write("# Kafka → Azure Service Bus Migration Report\n\n")
                 f.write("*Generated by static analysis*\n\n")
                 
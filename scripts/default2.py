@@ -5,8 +5,31 @@ import re
 import json
 import sys
 import argparse
-from typing import List, Dict
-from openai import AzureOpenAI
+import hashlib
+import io
+import multiprocessing
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import BinaryIO, Callable, List, Dict, Iterator, NamedTuple, Optional, Tuple
+from openai import AzureOpenAI, BadRequestError
+
+# orjson is optional; it is a much faster drop-in for parsing config files
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_loads(data):
+    return orjson.loads(data) if orjson else json.loads(data)
+
+# pyahocorasick is optional; without it keyword sets are matched with one compiled alternation
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # ========== Configuration ==========
 
@@ -19,15 +42,169 @@ def parse_args():
     parser.add_argument('--api-version', help='API version (optional)')
     parser.add_argument('--base-url', required=True, help='API endpoint URL (required)')
     parser.add_argument('--api-key', required=True, help='AI API key (required)')
+    parser.add_argument('--use-batch-api', action='store_true', help='Send the GPT-4 prompts through the provider Batch API')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore and do not update cached GPT-4 replies and per-file results')
+    parser.add_argument('--embedding-model', help='Embedding deployment used to skip unlikely candidates before GPT-4 (optional)')
     return parser.parse_args()
 
 # Max number of characters from a file snippet to send to GPT‑4
 GPT4_SNIPPET_MAX_CHARS = 2000
+# GPT‑4 requests in flight at once; the calls are network-bound, so they overlap on threads
+GPT4_MAX_CONCURRENCY = int(os.environ.get("GPT4_MAX_CONCURRENCY", "8"))
+# Snippets packed into one GPT‑4 request, bounded by count and by total characters
+GPT4_SNIPPETS_PER_REQUEST = int(os.environ.get("GPT4_SNIPPETS_PER_REQUEST", "5"))
+GPT4_PACK_MAX_CHARS = 8000
+# Startup/test candidates without a keyword hit only reach GPT‑4 when their snippet embedding
+# is at least this similar to KAFKA_REFERENCE_TEXT (needs --embedding-model)
+GPT4_EMBEDDING_MIN_SIMILARITY = float(os.environ.get("GPT4_EMBEDDING_MIN_SIMILARITY", "0.35"))
+EMBEDDING_BATCH_SIZE = 100
+# Client-side retries for 429/5xx/connection errors; the SDK backs off exponentially and honors Retry-After
+GPT4_MAX_RETRIES = 5
+# Max tokens GPT‑4 may generate per snippet; replies are a small JSON object
+GPT4_MAX_OUTPUT_TOKENS = 120
+# A reply cut off at the token limit is unparseable JSON, so it is retried once with this much more room
+GPT4_TRUNCATED_RETRY_FACTOR = 4
+# Proactive provider quotas (requests and estimated tokens per minute); 0 disables a limit
+GPT4_MAX_REQUESTS_PER_MINUTE = int(os.environ.get("LLM_MAX_RPM", "0"))
+GPT4_MAX_TOKENS_PER_MINUTE = int(os.environ.get("LLM_MAX_TPM", "0"))
+# Threads for reading repository files; reads release the GIL, so they overlap
+FILE_READ_WORKERS = int(os.environ.get("REPO_READ_WORKERS", "32"))
+# Keyword scans read files in blocks of this size and stop at the first hit
+FILE_SCAN_BLOCK_SIZE = 65536
+# Files larger than this (usually generated or vendored) only have their first and last edge bytes scanned
+FILE_SCAN_MAX_BYTES = 2 * 1024 * 1024
+FILE_SCAN_EDGE_BYTES = 256 * 1024
+# csproj XML parsing holds the GIL, so above this many files it moves to worker processes
+CPU_SCAN_PROCESS_THRESHOLD = 50
+
+# Exact-match response cache for the temperature=0 calls, shared with default.py's cache directory.
+# Per-user rather than relative: the server runs the scripts inside the analyzed checkout
+LLM_CACHE_DIR = os.path.expanduser(os.environ.get("LLM_CACHE_DIR", os.path.join("~", ".cache", "repocloner", "llm")))
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_TTL_SECONDS = 7 * 86400
+
+class LLMCache:
+    """
+    Exact-match response cache for temperature=0 calls, backed by SQLite.
+    Keys are SHA-256 digests of the full request and endpoint, so re-runs on
+    an unchanged repository skip the API entirely.
+    """
+
+    def __init__(self, cache_dir: str, ttl_seconds: int, enabled: bool = True):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.stats = {"hits": 0, "misses": 0}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(request: Dict, base_url: str) -> str:
+        payload = {"request": request, "base_url": base_url}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.cache_dir, "responses.sqlite3"), check_same_thread=False)
+            # WAL lets concurrent analysis processes read while one writes
+            try:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            except sqlite3.Error:
+                pass
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            try:
+                row = self._connection().execute(
+                    "SELECT content FROM responses WHERE key = ? AND expires_at > ?", (key, time.time())
+                ).fetchone()
+            except sqlite3.Error:
+                row = None
+            self.stats["hits" if row else "misses"] += 1
+        return row[0] if row else None
+
+    def set(self, key: str, content: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, content, expires_at) VALUES (?, ?, ?)",
+                    (key, content, time.time() + self.ttl_seconds),
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ LLM cache write failed: {e}", file=sys.stderr)
+
+llm_cache = LLMCache(LLM_CACHE_DIR, LLM_CACHE_TTL_SECONDS, LLM_CACHE_ENABLED)
+
+class RateLimiter:
+    """
+    Token buckets for requests and tokens per minute, shared by the worker threads,
+    so throughput stays under the provider quota instead of discovering it through 429s.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_capacity = float(requests_per_minute)
+        self._token_capacity = float(tokens_per_minute)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        if not self.requests_per_minute and not self.tokens_per_minute:
+            return
+        # A single call larger than the whole bucket would otherwise wait forever
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self._updated_at
+                self._updated_at = now
+                self._request_capacity = min(
+                    self.requests_per_minute, self._request_capacity + elapsed * self.requests_per_minute / 60
+                )
+                self._token_capacity = min(
+                    self.tokens_per_minute, self._token_capacity + elapsed * self.tokens_per_minute / 60
+                )
+
+                wait = 0.0
+                if self.requests_per_minute and self._request_capacity < 1:
+                    wait = (1 - self._request_capacity) * 60 / self.requests_per_minute
+                if self.tokens_per_minute and self._token_capacity < tokens:
+                    wait = max(wait, (tokens - self._token_capacity) * 60 / self.tokens_per_minute)
+                if not wait:
+                    self._request_capacity -= 1
+                    self._token_capacity -= tokens
+                    return
+            time.sleep(wait)
+
+rate_limiter = RateLimiter(GPT4_MAX_REQUESTS_PER_MINUTE, GPT4_MAX_TOKENS_PER_MINUTE)
 
 # ========== File Scanning ==========
 
+# Directories never scanned: VCS metadata, package caches and .NET build output
+SKIPPED_DIRS = frozenset({".git", "node_modules", "packages", "bin", "obj"})
+# Tool-generated C# sources (lower-cased), which are large and never hand-written Kafka code
+GENERATED_CS_SUFFIXES = (".g.cs", ".g.i.cs", ".designer.cs")
+GENERATED_CS_NAMES = frozenset({"assemblyinfo.cs"})
+
 def scan_project_files(root_dir: str) -> Dict[str, List[str]]:
-    """Scan and classify project files."""
+    """
+    Scan and classify project files.
+    Same top-down order as os.walk, but driven by scandir so entry types come from the directory read.
+    """
     files = {
         "cs_files": [],
         "csproj_files": [],
@@ -37,27 +214,122 @@ def scan_project_files(root_dir: str) -> Dict[str, List[str]]:
         "infra_files": [],
         "doc_files": []
     }
-    for dirpath, _, filenames in os.walk(root_dir):
-        for fname in filenames:
-            full = os.path.join(dirpath, fname)
+    # Every entry path starts with `root`, so relative paths are a slice instead of os.path.relpath
+    root = os.path.join(root_dir, "")
+    root_len = len(root)
+    pending_dirs = [root_dir]
+    while pending_dirs:
+        dirpath = pending_dirs.pop()
+        try:
+            with os.scandir(dirpath) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        in_tests_dir = "tests" in dirpath.lower()
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if entry.name.lower() not in SKIPPED_DIRS and not entry.is_symlink():
+                    subdirs.append(entry.path)
+                continue
+            fname = entry.name.lower()
             # Store relative paths (not absolute Windows paths)
-            relative = os.path.relpath(full, root_dir)
-            if fname.lower().endswith(".cs"):
+            relative = entry.path[root_len:]
+            if fname.endswith(".cs"):
+                if fname.endswith(GENERATED_CS_SUFFIXES) or fname in GENERATED_CS_NAMES:
+                    continue
                 files["cs_files"].append(relative)
-                if "test" in fname.lower() or "tests" in dirpath.lower():
+                if "test" in fname or in_tests_dir:
                     files["test_files"].append(relative)
-                if fname.lower() in ("startup.cs", "program.cs"):
+                if fname in ("startup.cs", "program.cs"):
                     files["startup_files"].append(relative)
-            elif fname.lower().endswith(".csproj"):
+            elif fname.endswith(".csproj"):
                 files["csproj_files"].append(relative)
-            elif fname.lower().startswith("appsettings") and fname.lower().endswith(".json"):
+            elif fname.startswith("appsettings") and fname.endswith(".json"):
                 files["config_files"].append(relative)
-            elif fname.lower().endswith((".yaml", ".yml", ".tf", ".dockerfile")) or "docker" in fname.lower():
+            elif fname.endswith((".yaml", ".yml", ".tf", ".dockerfile")) or "docker" in fname:
                 files["infra_files"].append(relative)
-            elif fname.lower().endswith((".md", ".txt")):
+            elif fname.endswith((".md", ".txt")):
                 files["doc_files"].append(relative)
+        pending_dirs.extend(reversed(subdirs))
     return files
 
+def keyword_matcher(keywords: List[str], ignore_case: bool = False) -> Callable[[str], bool]:
+    """Build a test for whether content contains any of the keywords, done in a single pass."""
+    if ahocorasick and not ignore_case:
+        automaton = ahocorasick.Automaton()
+        for kw in keywords:
+            automaton.add_word(kw, kw)
+        automaton.make_automaton()
+        return lambda content: next(automaton.iter(content), None) is not None
+    # Case-insensitive sets use the regex engine, which avoids a lowered copy of the file
+    pattern = re.compile("|".join(map(re.escape, keywords)), re.IGNORECASE if ignore_case else 0)
+    return lambda content: pattern.search(content) is not None
+
+def keyword_stream_matcher(keywords: List[str], ignore_case: bool = False) -> Callable[[BinaryIO], bool]:
+    """
+    Build a test for whether a file opened in binary mode contains any of the (ASCII) keywords. The file is
+    read in blocks that overlap by one keyword length, stopping at the first hit.
+    Files over FILE_SCAN_MAX_BYTES only have their first and last FILE_SCAN_EDGE_BYTES scanned.
+    """
+    if ahocorasick and not ignore_case:
+        # The automaton only takes str; latin-1 maps bytes one-to-one and never fails
+        match_text = keyword_matcher(keywords)
+        match = lambda block: match_text(block.decode("latin-1"))
+    else:
+        # Raw bytes go straight to the regex engine, which folds ASCII case itself
+        pattern = re.compile(b"|".join(re.escape(kw.encode("ascii")) for kw in keywords), re.IGNORECASE if ignore_case else 0)
+        match = lambda block: pattern.search(block) is not None
+    overlap = max(map(len, keywords)) - 1
+
+    def scan(f, limit: Optional[int]) -> bool:
+        tail = b""
+        remaining = limit
+        while remaining is None or remaining > 0:
+            block = f.read(FILE_SCAN_BLOCK_SIZE if remaining is None else min(FILE_SCAN_BLOCK_SIZE, remaining))
+            if not block:
+                return False
+            if remaining is not None:
+                remaining -= len(block)
+            buf = tail + block
+            if match(buf):
+                return True
+            tail = buf[len(buf) - overlap:] if overlap else b""
+        return False
+
+    def matches(f: BinaryIO) -> bool:
+        size = os.fstat(f.fileno()).st_size
+        if size <= FILE_SCAN_MAX_BYTES:
+            return scan(f, None)
+        if scan(f, FILE_SCAN_EDGE_BYTES):
+            return True
+        f.seek(size - FILE_SCAN_EDGE_BYTES)
+        return scan(f, FILE_SCAN_EDGE_BYTES)
+
+    return matches
+
+def keyword_file_matcher(keywords: List[str], ignore_case: bool = False) -> Callable[[str], bool]:
+    """Path-based keyword_stream_matcher; files that cannot be opened never match."""
+    matches_stream = keyword_stream_matcher(keywords, ignore_case)
+
+    def matches(full_path: str) -> bool:
+        try:
+            with open(full_path, "rb") as f:
+                return matches_stream(f)
+        except OSError:
+            return False
+
+    return matches
+
+def files_matching(root_dir: str, rel_paths: List[str], match_file: Callable[[str], bool], executor: ThreadPoolExecutor) -> List[str]:
+    """Relative paths for which match_file(full_path) holds; files are checked concurrently and keep their order."""
+    hits = executor.map(lambda rel_path: match_file(os.path.join(root_dir, rel_path)), rel_paths)
+    return [rel_path for rel_path, hit in zip(rel_paths, hits) if hit]
+
 # ========== Manual Keyword-based Detection ==========
 
 MANUAL_KAFKA_KEYWORDS = [
@@ -72,58 +344,96 @@ MANUAL_KAFKA_KEYWORDS = [
     "IKafkaConsumer"
 ]
 
-def detect_config_keys(file_paths: List[str], root_dir: str) -> List[Dict[str, object]]:
+KAFKA_CONFIG_KEY_SUBSTRINGS = [
+    "kafka", "bootstrapservers", "groupid", "enableautocommit",
+    "autooffsetreset", "sasl", "kerberos", "partitioneof"
+]
+
+# Quoted strings containing any of the key substrings, found in a single pass over the content
+CONFIG_KEY_RE = re.compile(
+    rf'["\']([^"\']*(?:{"|".join(map(re.escape, KAFKA_CONFIG_KEY_SUBSTRINGS))})[^"\']*)["\']',
+    re.IGNORECASE
+)
+
+JSON_LINE_COMMENT_RE = re.compile(r"//.*")
+# Flattened JSON keys are already lower-cased
+has_config_key_substring = keyword_matcher(KAFKA_CONFIG_KEY_SUBSTRINGS)
+
+def iter_flattened(d: dict) -> Iterator[Tuple[str, object]]:
+    """Yield ("section:key", value) for every leaf of nested dicts, keys lower-cased; iterative, so depth costs nothing."""
+    stack = [("", d)]
+    while stack:
+        prefix, node = stack.pop()
+        for k, v in node.items():
+            new_key = f"{prefix}:{k}" if prefix else k
+            if isinstance(v, dict):
+                stack.append((new_key, v))
+            else:
+                yield new_key.lower(), v
+
+def scan_config_file(file: str) -> set:
+    """Kafka-related keys found in one config (.json) or source (.cs) file."""
+    found_keys = set()
+    try:
+        if file.endswith(".json"):
+            with open(file, "r", encoding="utf-8") as f:
+                try:
+                    raw = f.read()
+                    # Remove comments if any (not valid JSON)
+                    raw = JSON_LINE_COMMENT_RE.sub("", raw)
+                    # Only objects can hold config keys; skip anything else without parsing it
+                    if not raw.lstrip().startswith("{"):
+                        return found_keys
+                    data = json_loads(raw)
+
+                    for key, _ in iter_flattened(data):
+                        if has_config_key_substring(key):
+                            found_keys.add(key)
+                except json.JSONDecodeError:
+                    pass
+        elif file.endswith(".cs"):
+            with open(file, "r", encoding="utf-8") as f:
+                content = f.read()
+                for match in CONFIG_KEY_RE.findall(content):
+                    found_keys.add(match.strip('"\''))
+    except Exception:
+        return set()
+    return found_keys
+
+_cpu_pool: Optional[ProcessPoolExecutor] = None
+
+def cpu_process_pool() -> ProcessPoolExecutor:
+    """
+    The run's one worker-process pool, created on first use. Workers are spawned
+    rather than forked: forking after the file-read thread pool has run can copy held locks.
+    """
+    global _cpu_pool
+    if _cpu_pool is None:
+        _cpu_pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+    return _cpu_pool
+
+def map_cpu_bound(fn: Callable, items: List) -> List:
+    """
+    Map a module-level fn over items, in order. Large inputs fan out to the shared
+    process pool; smaller ones run inline to skip worker start-up.
+    Call it outside any thread pool block.
+    """
+    if len(items) > CPU_SCAN_PROCESS_THRESHOLD:
+        return list(cpu_process_pool().map(fn, items, chunksize=8))
+    return [fn(item) for item in items]
+
+def detect_config_keys(file_paths: List[str], root_dir: str, executor: Optional[ThreadPoolExecutor] = None) -> List[Dict[str, object]]:
     """
     Detect Kafka-related config keys in config files.
     Args:
         file_paths: List of absolute file paths
         root_dir: Root directory for converting to relative paths
+        executor: Optional thread pool to read the files on
     Returns:
         List of dicts with relative file paths and keys
     """
     kafka_keys = []
-    kafka_key_substrings = [
-        "kafka", "bootstrapservers", "groupid", "enableautocommit",
-        "autooffsetreset", "sasl", "kerberos", "partitioneof"
-    ]
-
-    def flatten_dict(d, parent_key=''):
-        items = []
-        for k, v in d.items():
-            new_key = f"{parent_key}:{k}" if parent_key else k
-            if isinstance(v, dict):
-                items.extend(flatten_dict(v, new_key).items())
-            else:
-                items.append((new_key.lower(), v))
-        return dict(items)
-
-    for file in file_paths:
-        found_keys = set()
-        try:
-            if file.endswith(".json"):
-                with open(file, "r", encoding="utf-8") as f:
-                    try:
-                        raw = f.read()
-                        # Remove comments if any (not valid JSON)
-                        raw = re.sub(r"//.*", "", raw)
-                        data = json.loads(raw)
-                        flat = flatten_dict(data)
-
-                        for key in flat:
-                            if any(sub in key for sub in kafka_key_substrings):
-                                found_keys.add(key)
-                    except json.JSONDecodeError:
-                        continue
-            elif file.endswith(".cs"):
-                with open(file, "r", encoding="utf-8") as f:
-                    content = f.read()
-                    for keyword in kafka_key_substrings:
-                        matches = re.findall(rf'["\']([^"\']*{keyword}[^"\']*)["\']', content, re.IGNORECASE)
-                        for match in matches:
-                            found_keys.add(match.strip('"\''))
-        except Exception:
-            continue
-
+    for file, found_keys in zip(file_paths, (executor.map if executor else map)(scan_config_file, file_paths)):
         if found_keys:
             # Convert to relative path before storing
             relative_path = os.path.relpath(file, root_dir)
@@ -134,14 +444,48 @@ def detect_config_keys(file_paths: List[str], root_dir: str) -> List[Dict[str, o
 
     return kafka_keys
 
+has_manual_kafka_keyword = keyword_matcher(MANUAL_KAFKA_KEYWORDS)
+
 def manual_detect_kafka(content: str) -> bool:
-    for kw in MANUAL_KAFKA_KEYWORDS:
-        if kw in content:
-            return True
-    return False
+    return has_manual_kafka_keyword(content)
+
+# File-level variants used by the repository scans
+manual_detect_kafka_stream = keyword_stream_matcher(MANUAL_KAFKA_KEYWORDS)
+file_mentions_kafka = keyword_file_matcher(["kafka"], ignore_case=True)
+file_mentions_kafka_or_confluent = keyword_file_matcher(["kafka", "confluent"], ignore_case=True)
+
+# Startup/test files without a manual hit only reach GPT‑4 if their snippet mentions messaging at all
+MESSAGING_HINT_KEYWORDS = ["kafka", "confluent", "producer", "consumer", "messagebus"]
+has_messaging_hint = keyword_matcher(MESSAGING_HINT_KEYWORDS, ignore_case=True)
 
 # ========== GPT‑4 Assisted Detection ==========
 
+def create_chat_completion(client: AzureOpenAI, request: Dict) -> str:
+    """Return the reply content for a chat completion request, answering repeats from llm_cache."""
+    cache_key = llm_cache.cache_key(request, str(client.base_url))
+    content = llm_cache.get(cache_key)
+    if content is not None:
+        return content
+    def complete(req: Dict):
+        # Prompt estimated at ~4 characters per token, plus the completion budget
+        rate_limiter.acquire(len(req["messages"][-1]["content"]) // 4 + req["max_tokens"])
+        try:
+            return client.chat.completions.create(**req).choices[0]
+        except BadRequestError as e:
+            # Older deployments reject JSON mode; the prompt itself still asks for JSON
+            if "response_format" not in req or "response_format" not in str(e):
+                raise
+            return client.chat.completions.create(**{k: v for k, v in req.items() if k != "response_format"}).choices[0]
+
+    choice = complete(request)
+    if choice.finish_reason == "length":
+        choice = complete({**request, "max_tokens": request["max_tokens"] * GPT4_TRUNCATED_RETRY_FACTOR})
+    content = choice.message.content or ""
+    # A reply that is still truncated is not worth replaying from the cache
+    if choice.finish_reason != "length":
+        llm_cache.set(cache_key, content)
+    return content
+
 def ask_gpt4_for_kafka_usage(code_snippet: str, client: AzureOpenAI, model: str) -> Dict[str, str]:
     """Ask GPT‑4 whether the snippet uses Kafka, and what role(s).
 Returns a dict like:
@@ -157,28 +501,26 @@ Returns a dict like:
 Please analyze it and tell me:
 1. Does it use Kafka? (yes / no / maybe)
 2. If yes or maybe, is it acting as a producer, a consumer, or both?
-3. What clues in the snippet point to that role (line numbers, methods, API names, etc.)?
+3. In one short sentence, which methods or API names point to that role?
+
+Answer with only a JSON object of the form
+{{"uses_kafka": "yes|no|maybe", "role": "producer|consumer|both|unknown", "explanation": "<one short sentence>"}}
 
 Here is the snippet:
 
 {code_snippet}
 """
 
-    resp = client.chat.completions.create(
-        model=model,
-        temperature=0,
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant for code analysis."},
+    content = create_chat_completion(client, {
+        "model": model,
+        "temperature": 0,
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant for code analysis. Respond only with JSON."},
             {"role": "user", "content": prompt}
         ],
-        max_tokens=200
-    )
-
-    content = resp.choices[0].message.content
-    if content is None:
-        content = ""
-    else:
-        content = content.strip()
+        "max_tokens": GPT4_MAX_OUTPUT_TOKENS,
+        "response_format": {"type": "json_object"}
+    }).strip()
 
     # Try parsing the JSON
     try:
@@ -198,38 +540,323 @@ Here is the snippet:
             "raw_response": content
         }
 
+def kafka_usage_batch_request(snippets: List[str], model: str) -> Dict:
+    """Chat completion arguments asking GPT‑4 about several snippets at once."""
+    blocks = "".join(f"===FILE {idx}===\n{snippet}\n" for idx, snippet in enumerate(snippets))
+    prompt = f"""You are an expert in C# messaging systems. I will give you {len(snippets)} C# code snippets, each starting with a ===FILE k=== line.
+For each snippet, tell me:
+1. Does it use Kafka? (yes / no / maybe)
+2. If yes or maybe, is it acting as a producer, a consumer, or both?
+3. In one short sentence, which methods or API names point to that role?
+
+Answer with only a JSON object of the form
+{{"results": [{{"idx": k, "uses_kafka": "yes|no|maybe", "role": "producer|consumer|both|unknown", "explanation": "<one short sentence>"}}]}}
+with exactly one entry per snippet.
+
+{blocks}===END===
+"""
+    return {
+        "model": model,
+        "temperature": 0,
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant for code analysis. Respond only with JSON."},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": GPT4_MAX_OUTPUT_TOKENS * len(snippets),
+        "response_format": {"type": "json_object"}
+    }
+
+def parse_kafka_usage_batch(content: str, snippets: List[str], client: AzureOpenAI, model: str) -> List[Dict[str, str]]:
+    """Split a multi-snippet reply into one result per snippet, re-asking any snippet it is missing."""
+    content = content.strip()
+    results_by_idx = {}
+    try:
+        parsed = json.loads(content)
+    except json.JSONDecodeError:
+        parsed = None
+    # Anything but {"results": [...]} (a bare list, "results": null, ...) is re-asked per snippet
+    items = parsed.get("results") if isinstance(parsed, dict) else None
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, dict) and isinstance(item.get("idx"), int):
+            results_by_idx[item["idx"]] = item
+
+    results = []
+    for idx, snippet in enumerate(snippets):
+        item = results_by_idx.get(idx)
+        if item is None:
+            results.append(ask_gpt4_for_kafka_usage(snippet, client, model))
+            continue
+        results.append({
+            "uses_kafka": item.get("uses_kafka", "unknown"),
+            "role": item.get("role", "unknown"),
+            "explanation": item.get("explanation", ""),
+            "raw_response": item.get("explanation", "")
+        })
+    return results
+
+def ask_gpt4_for_kafka_usage_batch(snippets: List[str], client: AzureOpenAI, model: str) -> List[Dict[str, str]]:
+    """Ask GPT‑4 about several snippets in a single request.
+Returns one dict per snippet, in order, shaped like ask_gpt4_for_kafka_usage's result.
+Snippets missing from the reply (or a reply that is not valid JSON) are re-asked one at a time.
+"""
+    if len(snippets) == 1:
+        return [ask_gpt4_for_kafka_usage(snippets[0], client, model)]
+
+    content = create_chat_completion(client, kafka_usage_batch_request(snippets, model))
+    return parse_kafka_usage_batch(content, snippets, client, model)
+
+def batch_submit(groups: List[List[str]], client: AzureOpenAI, model: str, poll_interval: int = 30) -> List[str]:
+    """
+    Run one multi-snippet request per group through the Batch API (files + batches)
+    and return the reply contents in group order. Groups already in llm_cache are not submitted.
+    """
+    requests = [kafka_usage_batch_request(snippets, model) for snippets in groups]
+    cache_keys = [llm_cache.cache_key(request, str(client.base_url)) for request in requests]
+    contents: Dict[str, str] = {}
+    for idx, cache_key in enumerate(cache_keys):
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            contents[f"group-{idx}"] = cached
+    pending = [idx for idx in range(len(groups)) if f"group-{idx}" not in contents]
+    if not pending:
+        return [contents[f"group-{idx}"] for idx in range(len(groups))]
+
+    lines = []
+    for idx in pending:
+        lines.append(json.dumps({
+            "custom_id": f"group-{idx}",
+            "method": "POST",
+            "url": "/chat/completions",
+            "body": requests[idx],
+        }))
+    input_file = client.files.create(
+        file=("batch.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/chat/completions",
+        completion_window="24h"
+    )
+    print(f"📦 Submitted batch {batch.id} with {len(pending)} requests", file=sys.stderr)
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+        print(f"⏳ Batch {batch.id} status: {batch.status}", file=sys.stderr)
+
+    if batch.status != "completed" or not batch.output_file_id:
+        raise Exception(f"Batch {batch.id} finished with status {batch.status}")
+
+    truncated = set()
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        body = (record.get("response") or {}).get("body") or {}
+        if body.get("choices"):
+            contents[record["custom_id"]] = body["choices"][0]["message"]["content"] or ""
+            if body["choices"][0].get("finish_reason") == "length":
+                # Truncated, so parsing will re-ask its snippets one at a time; keep it out of the cache
+                truncated.add(record["custom_id"])
+
+    missing = [idx for idx in pending if f"group-{idx}" not in contents]
+    if missing:
+        raise Exception(f"Batch {batch.id} returned no result for {len(missing)} requests")
+    for idx in pending:
+        if f"group-{idx}" not in truncated:
+            llm_cache.set(cache_keys[idx], contents[f"group-{idx}"])
+    return [contents[f"group-{idx}"] for idx in range(len(groups))]
+
+KAFKA_REFERENCE_TEXT = "Confluent.Kafka ProducerBuilder ConsumerBuilder IProducer IConsumer ProduceAsync Consume Subscribe bootstrap.servers"
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = (sum(x * x for x in a) * sum(y * y for y in b)) ** 0.5
+    return dot / norm if norm else 0.0
+
+def kafka_similarity_scores(snippets: List[str], client: AzureOpenAI, embedding_model: str) -> List[float]:
+    """Cosine similarity of each snippet's embedding to KAFKA_REFERENCE_TEXT, in snippet order."""
+    reference = client.embeddings.create(
+        model=embedding_model, input=[KAFKA_REFERENCE_TEXT], encoding_format="float"
+    ).data[0].embedding
+    scores = []
+    for start in range(0, len(snippets), EMBEDDING_BATCH_SIZE):
+        resp = client.embeddings.create(
+            model=embedding_model, input=snippets[start:start + EMBEDDING_BATCH_SIZE], encoding_format="float"
+        )
+        for item in sorted(resp.data, key=lambda d: d.index):
+            scores.append(cosine_similarity(reference, item.embedding))
+    return scores
+
+def group_snippets(snippets: List[Tuple[str, str]]) -> Iterator[List[Tuple[str, str]]]:
+    """Group (file, snippet) pairs into packs of at most GPT4_SNIPPETS_PER_REQUEST and ~GPT4_PACK_MAX_CHARS."""
+    group: List[Tuple[str, str]] = []
+    size = 0
+    for item in snippets:
+        if group and (len(group) == GPT4_SNIPPETS_PER_REQUEST or size + len(item[1]) > GPT4_PACK_MAX_CHARS):
+            yield group
+            group, size = [], 0
+        group.append(item)
+        size += len(item[1])
+    if group:
+        yield group
+
+def clip_snippet(data: str, max_chars: int) -> str:
+    # If very long, maybe take middle or relevant sections
+    if len(data) > max_chars:
+        # Maybe take first and last parts
+        return data[: max_chars//2] + "\n// ... (omitted) ...\n" + data[-max_chars//2 :]
+    else:
+        return data
+
 def get_snippet_from_file(file_path: str, max_chars: int) -> str:
     """Return the first up to max_chars of the file for sending to GPT4."""
     try:
         with open(file_path, "r", encoding="utf-8") as f:
-            data = f.read()
-            # If very long, maybe take middle or relevant sections
-            if len(data) > max_chars:
-                # Maybe take first and last parts
-                return data[: max_chars//2] + "\n// ... (omitted) ...\n" + data[-max_chars//2 :]
-            else:
-                return data
+            return clip_snippet(f.read(), max_chars)
     except Exception as e:
         return ""
 
+def scan_source_file(full_path: str, snippet_max_chars: int, always_snippet: bool = False) -> Tuple[bool, str]:
+    """
+    Manual Kafka detection plus, for files that will be GPT‑4 candidates, the snippet,
+    from a single open of the file. The snippet is "" when not needed or not valid UTF-8.
+    """
+    try:
+        with open(full_path, "rb") as f:
+            hit = manual_detect_kafka_stream(f)
+            if not (hit or always_snippet):
+                return hit, ""
+            f.seek(0)
+            raw = f.read()
+    except OSError:
+        return False, ""
+    try:
+        # Same newline translation as reading in text mode
+        text = raw.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+    except UnicodeDecodeError:
+        return hit, ""
+    return hit, clip_snippet(text, snippet_max_chars)
+
 # ========== .csproj NuGet Parsing ==========
 
+# Fallback for project files that are not well-formed XML
+PACKAGE_REFERENCE_RE = re.compile(r"<PackageReference\s+Include=\"([^\"]+)\"\s+Version=\"([^\"]+)\"", re.IGNORECASE)
+
+def xml_local_name(tag: str) -> str:
+    """Tag without its namespace, lower-cased (old-style projects use the MSBuild namespace)."""
+    return tag.rsplit("}", 1)[-1].lower()
+
 def parse_csproj_nugets(csproj_file: str) -> List[Dict[str,str]]:
+    """
+    PackageReference items of a project, streamed with iterparse. Handles multi-line
+    elements and a nested <Version>; malformed XML falls back to PACKAGE_REFERENCE_RE.
+    """
+    results = []
+    try:
+        for _, el in ET.iterparse(csproj_file, events=("end",)):
+            if xml_local_name(el.tag) != "packagereference":
+                continue
+            # MSBuild attribute names are case-insensitive
+            attrs = {name.lower(): value for name, value in el.attrib.items()}
+            pkg = attrs.get("include")
+            if pkg:
+                version = attrs.get("version")
+                if version is None:
+                    version = next((child.text.strip() for child in el
+                                    if xml_local_name(child.tag) == "version" and child.text), "")
+                results.append({"package": pkg, "version": version})
+            # Drop the element so large projects are not held in memory as a tree
+            el.clear()
+    except ET.ParseError:
+        return parse_csproj_nugets_text(csproj_file)
+    except Exception as e:
+        print(f"Error parsing {csproj_file}: {e}", file=sys.stderr)
+    return results
+
+def parse_csproj_nugets_text(csproj_file: str) -> List[Dict[str,str]]:
     results = []
     try:
         with open(csproj_file, "r", encoding="utf-8") as f:
             content = f.read()
-        # Simple regex
-        matches = re.findall(r"<PackageReference Include=\"([^\"]+)\" Version=\"([^\"]+)\"", content, re.IGNORECASE)
+        matches = PACKAGE_REFERENCE_RE.findall(content)
         for pkg, version in matches:
             results.append({"package": pkg, "version": version})
     except Exception as e:
         print(f"Error parsing {csproj_file}: {e}", file=sys.stderr)
     return results
 
+# ========== Incremental Re-runs ==========
+
+# Bump when prompts or per-file results change shape, so older manifests are ignored
+SCAN_MANIFEST_VERSION = 2
+
+def scan_manifest_path(root_dir: str) -> str:
+    """Per-repository manifest location, kept in the LLM cache directory rather than the checkout."""
+    digest = hashlib.sha256(os.path.abspath(root_dir).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(LLM_CACHE_DIR, "manifests", f"{digest}.json")
+
+def load_scan_manifest(path: str, model: str, endpoint: str) -> Dict[str, Dict]:
+    """Per-file entries from the previous run; GPT‑4 results are dropped if the model or endpoint changed."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get("version") != SCAN_MANIFEST_VERSION:
+        return {}
+    entries = manifest.get("files", {})
+    if manifest.get("model") != model or manifest.get("endpoint") != endpoint:
+        for entry in entries.values():
+            entry.pop("gpt", None)
+    return entries
+
+def save_scan_manifest(path: str, model: str, endpoint: str, entries: Dict[str, Dict]):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": SCAN_MANIFEST_VERSION, "model": model, "endpoint": endpoint, "files": entries}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ Scan manifest write failed: {e}", file=sys.stderr)
+
+# Bump when the GPT‑4 prompts change, so cached per-snippet verdicts are not reused
+KAFKA_VERDICT_VERSION = 2
+
+def verdict_cache_key(snippet: str, model: str, base_url: str) -> str:
+    """
+    llm_cache key for one snippet's GPT‑4 verdict. It is addressed by the snippet
+    content rather than the path or prompt, and llm_cache lives in the per-user
+    LLM_CACHE_DIR, so a re-clone of the repository or a re-packed prompt still hits.
+    Unparseable ("unknown") verdicts are never stored, so those snippets are asked again.
+    """
+    digest = hashlib.sha256(snippet.encode("utf-8")).hexdigest()
+    return llm_cache.cache_key({"kafka_verdict": KAFKA_VERDICT_VERSION, "model": model, "snippet_sha256": digest}, base_url)
+
+def load_cached_verdict(cache_key: str) -> Optional[Dict[str, str]]:
+    content = llm_cache.get(cache_key)
+    if content is None:
+        return None
+    try:
+        verdict = json_loads(content)
+    except ValueError:
+        return None
+    return verdict if isinstance(verdict, dict) else None
+
+class SourceScan(NamedTuple):
+    manual_hit: bool
+    snippet: str
+    # GPT‑4 result reused from the manifest, when the file is unchanged
+    cached_result: Optional[Dict[str, str]]
+    # [mtime_ns, size], or None when no manifest is kept
+    fingerprint: Optional[List[int]]
+
 # ========== Report Generation ==========
 
-def generate_report(root_dir: str, client: AzureOpenAI, model: str) -> Dict:
+def generate_report(root_dir: str, client: AzureOpenAI, model: str, use_batch_api: bool = False,
+                    embedding_model: Optional[str] = None, scan_manifest: Optional[str] = None) -> Dict:
     files = scan_project_files(root_dir)
     report = {
         "manual_kafka_files": [],
@@ -241,95 +868,167 @@ def generate_report(root_dir: str, client: AzureOpenAI, model: str) -> Dict:
         "config_files": []
     }
 
-    # Manual detection on .cs and config files
-    for f in files["cs_files"] + files["config_files"]:
-        try:
-            full_path = os.path.join(root_dir, f)
-            with open(full_path, "r", encoding="utf-8") as rf:
-                content = rf.read()
-        except:
-            continue
+    source_files = files["cs_files"] + files["config_files"]
+    # Startup and test files are GPT‑4 candidates whatever the keyword scan finds
+    always_candidates = set(files["startup_files"]).union(files["test_files"])
+
+    previous = load_scan_manifest(scan_manifest, model, str(client.base_url)) if scan_manifest else {}
+
+    def scan_source(f: str) -> SourceScan:
+        full_path = os.path.join(root_dir, f)
+        fingerprint = None
+        if scan_manifest:
+            try:
+                st = os.stat(full_path)
+                fingerprint = [st.st_mtime_ns, st.st_size]
+            except OSError:
+                pass
+        entry = previous.get(f)
+        if fingerprint and entry and entry.get("fingerprint") == fingerprint:
+            # Unchanged since the last run: nothing to read unless it is a candidate without a result
+            if entry.get("gpt") is not None or not (entry["manual"] or f in always_candidates):
+                return SourceScan(entry["manual"], "", entry.get("gpt"), fingerprint)
+        hit, snippet = scan_source_file(full_path, GPT4_SNIPPET_MAX_CHARS, f in always_candidates)
+        return SourceScan(hit, snippet, None, fingerprint)
+
+    # Keyword scans only read files, so they share one thread pool and finish before the GPT‑4 step
+    with ThreadPoolExecutor(max_workers=FILE_READ_WORKERS) as io_executor:
+        # One pass over the .cs and config files yields manual detection, test impact and candidate snippets
+        source_scans = dict(zip(source_files, io_executor.map(scan_source, source_files)))
+
+        # Manual detection on .cs and config files
+        report["manual_kafka_files"] = [f for f in source_files if source_scans[f].manual_hit]
+
+        # Unit tests impact (test files are .cs files, so they were scanned above)
+        for tf in files["test_files"]:
+            if source_scans[tf].manual_hit:
+                report["unit_test_impact"].append({
+                    "file": tf,
+                    "note": "Contains Kafka usage — may need mocks or refactor for Service Bus"
+                })
+
+        # Infra files
+        report["infra_files_kafka"] = files_matching(root_dir, files["infra_files"], file_mentions_kafka, io_executor)
 
-        if manual_detect_kafka(content):
-            report["manual_kafka_files"].append(f)
+        # Docs
+        report["doc_references"] = files_matching(root_dir, files["doc_files"], file_mentions_kafka_or_confluent, io_executor)
+
+        # Config files with Kafka keys (need to convert relative to full paths)
+        config_full_paths = [os.path.join(root_dir, f) for f in files["config_files"]]
+        report["config_files"] = detect_config_keys(config_full_paths, root_dir, io_executor)
 
     # GPT‑4 analysis for files flagged via manual detection OR startup / wrappers
-    candidates = set(report["manual_kafka_files"])
+    # (an insertion-ordered dict, so candidates are analyzed in a stable order)
+    candidates = dict.fromkeys(report["manual_kafka_files"])
     # also consider wrappers / startup files if not already included
-    for f in files["startup_files"]:
-        if f not in candidates:
-            candidates.add(f)
+    candidates.update(dict.fromkeys(files["startup_files"]))
     # maybe also test files
-    for f in files["test_files"]:
-        if f not in candidates:
-            candidates.add(f)
+    candidates.update(dict.fromkeys(files["test_files"]))
 
-    for f in list(candidates):
-        full_path = os.path.join(root_dir, f)
-        snippet = get_snippet_from_file(full_path, GPT4_SNIPPET_MAX_CHARS)
-        if snippet.strip() == "":
-            continue
-        result = ask_gpt4_for_kafka_usage(snippet, client, model)
-        report["gpt4_kafka_results"].append({
-            "file": f,
-            "uses_kafka": result["uses_kafka"],
-            "role": result["role"],
-            "explanation": result["explanation"]    
-        })
+    def analyze_group(group: List[Tuple[str, str]]) -> List[Dict[str, str]]:
+        return ask_gpt4_for_kafka_usage_batch([snippet for _, snippet in group], client, model)
+
+    # Unchanged files keep their previous result; the rest are sent to GPT‑4
+    gpt4_results = {f: source_scans[f].cached_result for f in candidates if source_scans[f].cached_result is not None}
+
+    # The client is shared by the worker threads; results are collected in candidate order.
+    # Several snippets share each request, so the instructions are sent once per pack.
+    with ThreadPoolExecutor(max_workers=GPT4_MAX_CONCURRENCY) as executor:
+        snippets = [
+            (f, source_scans[f].snippet) for f in candidates
+            if f not in gpt4_results and source_scans[f].snippet.strip() != ""
+        ]
+        unhinted = {f for f, snippet in snippets if not source_scans[f].manual_hit and not has_messaging_hint(snippet)}
+        if unhinted:
+            snippets = [(f, snippet) for f, snippet in snippets if f not in unhinted]
+            print(f"🔎 Skipped {len(unhinted)} startup/test candidates with no messaging hints", file=sys.stderr)
+        # Snippets answered in an earlier run (any clone, any packing) skip GPT‑4 entirely
+        verdict_keys = {}
+        if llm_cache.enabled:
+            verdict_keys = {f: verdict_cache_key(snippet, model, str(client.base_url)) for f, snippet in snippets}
+            for f, _ in snippets:
+                verdict = load_cached_verdict(verdict_keys[f])
+                if verdict is not None:
+                    gpt4_results[f] = {"file": f, **verdict}
+            snippets = [(f, snippet) for f, snippet in snippets if f not in gpt4_results]
+        # Identical snippets (bootstraps copied across services) are asked about once and the verdict shared
+        duplicates: Dict[str, List[str]] = {}
+        first_by_snippet: Dict[Tuple[bool, str], str] = {}
+        unique_snippets = []
+        for f, snippet in snippets:
+            first = first_by_snippet.setdefault((source_scans[f].manual_hit, snippet), f)
+            if first == f:
+                unique_snippets.append((f, snippet))
+            else:
+                duplicates.setdefault(first, []).append(f)
+        snippets = unique_snippets
+        unconfirmed = [(f, snippet) for f, snippet in snippets if not source_scans[f].manual_hit]
+        if embedding_model and unconfirmed:
+            # Embeddings are far cheaper than chat calls, so they screen out candidates with no keyword hit
+            try:
+                scores = kafka_similarity_scores([snippet for _, snippet in unconfirmed], client, embedding_model)
+                skipped = {f for (f, _), score in zip(unconfirmed, scores) if score < GPT4_EMBEDDING_MIN_SIMILARITY}
+                snippets = [(f, snippet) for f, snippet in snippets if f not in skipped]
+                print(f"🔎 Embedding filter skipped {len(skipped)} of {len(unconfirmed)} unconfirmed candidates", file=sys.stderr)
+            except Exception as e:
+                print(f"⚠️ Embedding filter unavailable ({e}), sending every candidate to GPT‑4", file=sys.stderr)
+        groups = group_snippets(snippets)
+        analyzed = None
+        if use_batch_api:
+            groups = list(groups)
+            # Slower to come back, but billed at the discounted batch rate
+            try:
+                contents = batch_submit([[snippet for _, snippet in group] for group in groups], client, model) if groups else []
+                # Parsing, and any per-snippet re-asks it triggers, runs on the worker threads rather than here
+                parsed = executor.map(
+                    lambda group, content: parse_kafka_usage_batch(content, [snippet for _, snippet in group], client, model),
+                    groups, contents
+                )
+                analyzed = list(zip(groups, parsed))
+            except Exception as e:
+                print(f"⚠️ Batch API unavailable ({e}), falling back to concurrent requests", file=sys.stderr)
+        if analyzed is None:
+            futures = [(group, executor.submit(analyze_group, group)) for group in groups]
+            analyzed = ((group, future.result()) for group, future in futures)
+        for group, results in analyzed:
+            for (f, _), result in zip(group, results):
+                verdict = {
+                    "uses_kafka": result["uses_kafka"],
+                    "role": result["role"],
+                    "explanation": result["explanation"]
+                }
+                for same in [f] + duplicates.get(f, []):
+                    gpt4_results[same] = {"file": same, **verdict}
+                # "unknown" means the reply could not be parsed, so it is worth asking again next run
+                if f in verdict_keys and verdict["uses_kafka"] != "unknown":
+                    llm_cache.set(verdict_keys[f], json.dumps(verdict))
+    report["gpt4_kafka_results"] = [gpt4_results[f] for f in candidates if f in gpt4_results]
+
+    if scan_manifest:
+        entries = {}
+        for f in source_files:
+            scan = source_scans[f]
+            if scan.fingerprint is None:
+                continue
+            entries[f] = {"fingerprint": scan.fingerprint, "manual": scan.manual_hit}
+            if f in gpt4_results:
+                entries[f]["gpt"] = gpt4_results[f]
+        save_scan_manifest(scan_manifest, model, str(client.base_url), entries)
 
     # Parse csproj changes: remove Kafka packages
-    for csproj in files["csproj_files"]:
-        full_path = os.path.join(root_dir, csproj)
-        nugets = parse_csproj_nugets(full_path)
+    csproj_full_paths = [os.path.join(root_dir, f) for f in files["csproj_files"]]
+    for csproj, nugets in zip(files["csproj_files"], map_cpu_bound(parse_csproj_nugets, csproj_full_paths)):
         for item in nugets:
             pkg = item["package"]
             version = item["version"]
             if "kafka" in pkg.lower() or "confluent.kafka" in pkg.lower():
                 report["csproj_changes"].append({
                     "file": csproj,
-                    "remove": f"{pkg} ({version})",
+                    # Centrally managed packages carry no version in the project itself
+                    "remove": f"{pkg} ({version})" if version else pkg,
                     "add": "Azure.Messaging.ServiceBus (latest)"
                 })
 
-    # Unit tests impact
-    for tf in files["test_files"]:
-        try:
-            full_path = os.path.join(root_dir, tf)
-            with open(full_path, "r", encoding="utf-8") as f:
-                c = f.read()
-        except:
-            continue
-        if manual_detect_kafka(c):
-            report["unit_test_impact"].append({
-                "file": tf,
-                "note": "Contains Kafka usage — may need mocks or refactor for Service Bus"
-            })
-
-    # Infra files
-    for inf in files["infra_files"]:
-        try:
-            full_path = os.path.join(root_dir, inf)
-            with open(full_path, "r", encoding="utf-8") as f:
-                c = f.read().lower()
-        except:
-            continue
-        if "kafka" in c:
-            report["infra_files_kafka"].append(inf)
-
-    # Docs
-    for doc in files["doc_files"]:
-        try:
-            full_path = os.path.join(root_dir, doc)
-            with open(full_path, "r", encoding="utf-8") as f:
-                c = f.read().lower()
-        except:
-            continue
-        if "kafka" in c or "confluent" in c:
-            report["doc_references"].append(doc)
-
-    # Config files with Kafka keys (need to convert relative to full paths)
-    config_full_paths = [os.path.join(root_dir, f) for f in files["config_files"]]
-    report["config_files"] = detect_config_keys(config_full_paths, root_dir)
 
     return report
 
@@ -369,15 +1068,23 @@ def main():
         client = AzureOpenAI(
             api_key=args.api_key,
             api_version=api_version,
-            azure_endpoint=base_url
+            azure_endpoint=base_url,
+            max_retries=GPT4_MAX_RETRIES
         )
     except Exception as e:
         print(f"ERROR: Failed to initialize AI client: {e}", file=sys.stderr)
         sys.exit(1)
 
+    # Cached replies and per-file results are both skipped with --no-cache (or LLM_CACHE_ENABLED=0)
+    if args.no_cache:
+        llm_cache.enabled = False
+
     # Generate report
     try:
-        report = generate_report(root_dir, client, args.model)
+        report = generate_report(
+            root_dir, client, args.model, args.use_batch_api, args.embedding_model,
+            scan_manifest=scan_manifest_path(root_dir) if llm_cache.enabled else None
+        )
     except Exception as e:
         # Catch all errors including network/VPN failures
         error_msg = str(e)
@@ -386,9 +1093,10 @@ def main():
         else:
             print(f"ERROR: AI API call failed: {e}", file=sys.stderr)
         sys.exit(1)
+    if llm_cache.enabled:
+        print(f"🗄️ LLM cache: {llm_cache.stats['hits']} hits, {llm_cache.stats['misses']} misses", file=sys.stderr)
     
     # Transform report to match the expected format
-    import time
     transformed_report = {
         "meta": {
             "repoUrl": args.repo_url,
@@ -439,8 +1147,10 @@ def main():
             })
     
     # Map manual kafka files to inventory if not already present
+    seen_files = {item["file"] for item in transformed_report["inventory"]}
     for file in report.get("manual_kafka_files", []):
-        if not any(item["file"] == file for item in transformed_report["inventory"]):
+        if file not in seen_files:
+            seen_files.add(file)
             transformed_report["inventory"].append({
                 "file": file,
                 "kafka_apis": ["manual detection"],
@@ -484,12 +1194,12 @@ def main():
         })
     
     # Generate markdown report file with embedded JSON
-    import time
     analysis_id = str(int(time.time() * 1000))
     report_filename = f"migration-report-{analysis_id}.md"
     report_path = os.path.join(root_dir, report_filename)
     
-    with open(report_path, "w", encoding="utf-8") as f:
+    # Sections are assembled in memory and written to disk with one call
+    with io.StringIO() as f:
         f.write("# Quick Migration Analysis Report\n\n")
         f.write("*AI-powered Kafka to Azure Service Bus migration analysis using GPT-4*\n\n")
         f.write(f"**Repository:** {args.repo_url}\n\n")
@@ -560,6 +1270,9 @@ def main():
         f.write("```json\n")
         f.write(json.dumps(transformed_report, indent=2))
         f.write("\n```\n")
+        report_markdown = f.getvalue()
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write(report_markdown)
     
     print(f"✅ Quick Migration Analysis Report generated: {report_path}")
     # Also output JSON to stdout for compatibility
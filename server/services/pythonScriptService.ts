@@ -10,6 +10,29 @@ import { GeneratedFile, PythonScriptResult, MigrationReportData } from '@shared/
 const execAsync = promisify(exec);
 const execFileAsync = promisify(execFile);
 
+// Migration report patterns, compiled once at module load instead of on every parse
+const REPORT_TITLE_RE = /^#\s+(.+)$/m;
+const JSON_BLOCK_RE = /```json\s*\n([\s\S]*?)\n```/;
+const AI_RESULTS_SECTION_RE = /###\s*AI-Powered Analysis Results\s*\n([\s\S]*?)(?=###|##|```json|$)/iy;
+const PACKAGE_CHANGES_SECTION_RE = /###\s*NuGet Package Changes\s*\n([\s\S]*?)(?=###|##|```json|$)/iy;
+const MANUAL_DETECTION_SECTION_RE = /###\s*Manual Keyword Detection\s*\n([\s\S]*?)(?=###|##|```json|$)/iy;
+// Literal headings located before the section patterns run; case-insensitive like the patterns
+const AI_RESULTS_HEADING_RE = /AI-Powered Analysis Results/gi;
+const PACKAGE_CHANGES_HEADING_RE = /NuGet Package Changes/gi;
+const MANUAL_DETECTION_HEADING_RE = /Manual Keyword Detection/gi;
+const INVENTORY_HEADING_RE = /^##\s+\d+\.\s*Kafka Usage Inventory/i;
+const HEADING_PREFIX_RE = /^#+\s*/;
+const EXPLICIT_KEY_CHANGES_RE = /(?:^|[\r\n])\s*(?:\*\*|##?)?\s*Key\s+Changes\s*:?\s*[\r\n]+((?:[\s]*[-*•]\s+.+[\r\n]+)+)/i;
+const BULLET_LIST_RE = /(?:^|[\r\n])((?:[\s]*[-*•]\s+.+[\r\n]+)+)/;
+const BULLET_PREFIX_RE = /^[-*•]\s*/;
+const BULLET_MARKER_RE = /[-*•]/;
+const BULLET_CHARS = new Set(['-', '*', '•']);
+const LINE_BREAK_RE = /\r?\n/;
+const DIFF_SYNTAX_RE = /^(?:@@|---|\+\+\+|diff\s)/;
+const SUMMARY_BULLET_RE = /^[-*•]\s*(Replaced|Added|Used|Implemented|Updated|Removed|Changed|Fixed|Created|Modified|Introduced|Migrated|Converted)/i;
+const REGEX_SPECIAL_CHARS_RE = /[.*+?^${}()|[\]\\]/g;
+const HUNK_HEADER_RE = /^@@\s+-(\d+)(?:,(\d+))?\s+\+(\d+)(?:,(\d+))?\s+@@(.*)$/;
+
 export interface PythonExecutionResult {
   success: boolean;
   output?: string;
@@ -30,6 +53,9 @@ export interface PythonExecutionOptions {
 
 export class PythonScriptService {
   private defaultTimeout = 600000; // 10 minutes default timeout
+  private static readonly REPORT_CACHE_LIMIT = 32;
+  // Parsed migration reports keyed by path, mtime and size, kept in least-recently-used order
+  private reportCache = new Map<string, { content: string; data: MigrationReportData | null }>();
 
   /**
    * Execute a Python script with the provided options
@@ -584,8 +610,7 @@ export class PythonScriptService {
       }
 
       // Extract structured data from report
-      const reportContent = await fs.promises.readFile(reportPath, 'utf8');
-      const structuredData = await this.extractStructuredData(reportContent);
+      const { content: reportContent, data: structuredData } = await this.readParsedReport(reportPath);
 
       return {
         success: true,
@@ -634,17 +659,45 @@ export class PythonScriptService {
     }
   }
 
+  /**
+   * Read and parse a migration report, reusing the previous result while the file is unchanged
+   */
+  private async readParsedReport(reportPath: string): Promise<{ content: string; data: MigrationReportData | null }> {
+    const stats = await fs.promises.stat(reportPath);
+    const cacheKey = `${reportPath}:${stats.mtimeMs}:${stats.size}`;
+    
+    let entry = this.reportCache.get(cacheKey);
+    if (entry) {
+      // Refresh recency
+      this.reportCache.delete(cacheKey);
+    } else {
+      const content = await fs.promises.readFile(reportPath, 'utf8');
+      entry = { content, data: await this.extractStructuredData(content) };
+    }
+    
+    if (entry.data) {
+      this.reportCache.set(cacheKey, entry);
+      if (this.reportCache.size > PythonScriptService.REPORT_CACHE_LIMIT) {
+        this.reportCache.delete(this.reportCache.keys().next().value!);
+      }
+    }
+    
+    // Callers annotate the parsed data, so hand out a copy rather than the cached object
+    return { content: entry.content, data: entry.data ? structuredClone(entry.data) : null };
+  }
+
   /**
    * Extract structured data from migration report content
    */
   private async extractStructuredData(reportContent: string): Promise<MigrationReportData | null> {
     try {
       // Parse migration report sections using regex patterns
-      const titleMatch = reportContent.match(/^#\s+(.+)$/m);
+      const titleMatch = reportContent.match(REPORT_TITLE_RE);
       const title = titleMatch ? titleMatch[1] : 'Kafka to Azure Service Bus Migration Analysis';
 
-      // CRITICAL: Try to extract JSON block first (for default2.py reports)
-      const jsonBlockMatch = reportContent.match(/```json\s*\n([\s\S]*?)\n```/);
+      // CRITICAL: Try to extract JSON block first (for default2.py reports).
+      // A cheap substring check gates the regex so a missing block costs a single scan.
+      const jsonBlockMatch = reportContent.includes('```json') ? reportContent.match(JSON_BLOCK_RE) : null;
       
       if (jsonBlockMatch) {
         // Parse JSON structure from default2.py
@@ -660,21 +713,25 @@ export class PythonScriptService {
           }));
           
           // Map diffs array to code_diffs
-          const codeDiffs = (jsonData.diffs || []).map((item: any) => ({
-            file: item.file,
-            diff_content: item.diff || '',
-            description: item.description || '',
-            key_changes: item.key_changes || [],
-            language: this.inferLanguageFromFile(item.file),
-            hunks: this.parseDiffHunks(item.diff || ''),
-            stats: this.calculateDiffStats(item.diff || '')
-          }));
+          const codeDiffs = (jsonData.diffs || []).map((item: any) => {
+            const diff = item.diff || '';
+            const diffLines = diff.split(LINE_BREAK_RE);
+            return {
+              file: item.file,
+              diff_content: diff,
+              description: item.description || '',
+              key_changes: item.key_changes || [],
+              language: this.inferLanguageFromFile(item.file),
+              hunks: this.parseDiffHunks(diffLines),
+              stats: this.calculateDiffStats(diffLines)
+            };
+          });
           
           // Parse markdown sections for AI results and package changes
           const sections: any = {};
           
           // Extract AI-Powered Analysis Results section
-          const aiSectionMatch = reportContent.match(/###\s*AI-Powered Analysis Results\s*\n([\s\S]*?)(?=###|##|```json|$)/i);
+          const aiSectionMatch = this.matchReportSection(reportContent, AI_RESULTS_HEADING_RE, AI_RESULTS_SECTION_RE);
           if (aiSectionMatch && aiSectionMatch[1].trim()) {
             sections.ai_powered = {
               title: 'AI-Powered Analysis Results',
@@ -683,7 +740,7 @@ export class PythonScriptService {
           }
           
           // Extract NuGet Package Changes section
-          const packageSectionMatch = reportContent.match(/###\s*NuGet Package Changes\s*\n([\s\S]*?)(?=###|##|```json|$)/i);
+          const packageSectionMatch = this.matchReportSection(reportContent, PACKAGE_CHANGES_HEADING_RE, PACKAGE_CHANGES_SECTION_RE);
           if (packageSectionMatch && packageSectionMatch[1].trim()) {
             sections.package_changes = {
               title: 'NuGet Package Changes',
@@ -692,7 +749,7 @@ export class PythonScriptService {
           }
           
           // Extract Manual Keyword Detection section
-          const manualSectionMatch = reportContent.match(/###\s*Manual Keyword Detection\s*\n([\s\S]*?)(?=###|##|```json|$)/i);
+          const manualSectionMatch = this.matchReportSection(reportContent, MANUAL_DETECTION_HEADING_RE, MANUAL_DETECTION_SECTION_RE);
           if (manualSectionMatch && manualSectionMatch[1].trim()) {
             sections.manual_detection = {
               title: 'Manual Keyword Detection',
@@ -723,72 +780,99 @@ export class PythonScriptService {
       // FALLBACK: Extract Kafka inventory from markdown table (for default.py reports)
       const kafkaInventory: any[] = [];
       
-      // Find the Kafka Usage Inventory section
-      const inventorySection = reportContent.match(/##\s+\d+\.\s*Kafka Usage Inventory([\s\S]*?)(?=##|$)/i);
+      const reportLines = reportContent.split('\n');
       
-      if (inventorySection) {
-        // Parse markdown table rows (skip header and separator rows)
-        const tableRowRegex = /^\|\s*([^|]+?)\s*\|\s*([^|]+?)\s*\|\s*([^|]+?)\s*\|$/gm;
-        let rowMatch;
-        let rowCount = 0;
-        
-        while ((rowMatch = tableRowRegex.exec(inventorySection[1])) !== null) {
-          rowCount++;
-          // Skip header row (File | APIs Used | Summary) and separator row (---|---|---)
-          if (rowCount <= 2) continue;
-          
-          kafkaInventory.push({
-            file: rowMatch[1].trim(),
-            apis_used: rowMatch[2].trim(),
-            summary: rowMatch[3].trim()
-          });
-        }
-      }
-
       // Extract code diffs with descriptions and key changes
       const codeDiffs: any[] = [];
       
-      // Match file sections: ### filename, then description, then ```diff block
-      const fileSectionRegex = /###\s+([^\n]+)\n([\s\S]*?)(?=###|$)/g;
-      let fileMatch;
+      // Classify every line in a single pass: inside the Kafka Usage Inventory, table rows are
+      // parsed until the next heading; anywhere in the report, a ### heading followed by a line
+      // break starts a file section (### filename, then description, then ```diff block).
+      const headingIndexes: number[] = [];
+      let parseState: 'before_inventory' | 'inventory' | 'after_inventory' = 'before_inventory';
+      let rowCount = 0;
+      
+      for (let lineIndex = 0; lineIndex < reportLines.length; lineIndex++) {
+        const line = reportLines[lineIndex];
+        
+        if (parseState === 'inventory') {
+          if (line.startsWith('#')) {
+            parseState = 'after_inventory';
+          } else {
+            const row = line.trimEnd();
+            if (row.length < 2 || !row.startsWith('|') || !row.endsWith('|')) continue;
+            
+            const cells = row.slice(1, -1).split('|');
+            if (cells.length !== 3 || cells.some(cell => cell.length === 0)) continue;
+            
+            rowCount++;
+            // Skip header row (File | APIs Used | Summary) and separator row (---|---|---)
+            if (rowCount <= 2) continue;
+            
+            kafkaInventory.push({
+              file: cells[0].trim(),
+              apis_used: cells[1].trim(),
+              summary: cells[2].trim()
+            });
+            continue;
+          }
+        }
+        
+        if (parseState === 'before_inventory' && line.startsWith('##') && INVENTORY_HEADING_RE.test(line)) {
+          parseState = 'inventory';
+          continue;
+        }
+        
+        if (line.startsWith('###')) {
+          headingIndexes.push(lineIndex);
+        }
+      }
+      headingIndexes.push(reportLines.length);
       
-      while ((fileMatch = fileSectionRegex.exec(reportContent)) !== null) {
-        const fileName = fileMatch[1].replace(/`/g, '').trim();
-        let sectionContent = fileMatch[2].trim();
+      for (let h = 0; h < headingIndexes.length - 1; h++) {
+        const headingIndex = headingIndexes[h];
+        // A heading on an unterminated last line ends the previous section but starts none
+        if (headingIndex === reportLines.length - 1) continue;
+        const fileName = reportLines[headingIndex].replace(HEADING_PREFIX_RE, '').replace(/`/g, '').trim();
+        if (!fileName) continue;
+        let sectionContent = reportLines.slice(headingIndex + 1, headingIndexes[h + 1]).join('\n').trim();
         
         // Extract diff block (handle both Unix \n and Windows \r\n line endings)
-        const diffMatch = /```diff[\r\n]+([\s\S]*?)[\r\n]+```/.exec(sectionContent);
-        let diffContent = diffMatch ? diffMatch[1] : '';
+        const diffBlock = this.findDiffBlock(sectionContent);
+        let diffContent = diffBlock ? diffBlock.body : '';
         
         // Get description (everything before the diff block)
-        let description = diffMatch ? sectionContent.substring(0, diffMatch.index).trim() : sectionContent;
+        let description = diffBlock ? sectionContent.substring(0, diffBlock.start).trim() : sectionContent;
         
         // Extract key changes - check multiple locations
         let keyChanges: string[] = [];
         
+        // Both description patterns below need a bullet marker, so skip them when there is none
+        const descriptionHasBullets = BULLET_MARKER_RE.test(description);
+        
         // 1. First check for explicit "Key Changes:" header in description
-        const explicitKeyChangesMatch = /(?:^|[\r\n])\s*(?:\*\*|##?)?\s*Key\s+Changes\s*:?\s*[\r\n]+((?:[\s]*[-*•]\s+.+[\r\n]+)+)/i.exec(description);
+        const explicitKeyChangesMatch = descriptionHasBullets ? EXPLICIT_KEY_CHANGES_RE.exec(description) : null;
         
         if (explicitKeyChangesMatch) {
           keyChanges = explicitKeyChangesMatch[1]
-            .split(/\r?\n/)
+            .split(LINE_BREAK_RE)
             .map(line => line.trim())
-            .filter(line => line.startsWith('-') || line.startsWith('*') || line.startsWith('•'))
-            .map(line => line.replace(/^[-*•]\s*/, '').trim())
+            .filter(line => BULLET_CHARS.has(line.charAt(0)))
+            .map(line => line.replace(BULLET_PREFIX_RE, '').trim())
             .filter(line => line.length > 0);
           
           description = description.replace(explicitKeyChangesMatch[0], '').trim();
         } 
         // 2. Check for bullet lists in description
-        else {
-          const bulletListMatch = description.match(/(?:^|[\r\n])((?:[\s]*[-*•]\s+.+[\r\n]+)+)/);
+        else if (descriptionHasBullets) {
+          const bulletListMatch = description.match(BULLET_LIST_RE);
           
           if (bulletListMatch) {
             keyChanges = bulletListMatch[1]
-              .split(/\r?\n/)
+              .split(LINE_BREAK_RE)
               .map(line => line.trim())
-              .filter(line => line.startsWith('-') || line.startsWith('*') || line.startsWith('•'))
-              .map(line => line.replace(/^[-*•]\s*/, '').trim())
+              .filter(line => BULLET_CHARS.has(line.charAt(0)))
+              .map(line => line.replace(BULLET_PREFIX_RE, '').trim())
               .filter(line => line.length > 0);
             
             if (keyChanges.length > 0) {
@@ -800,45 +884,56 @@ export class PythonScriptService {
         // 3. CRITICAL: Check for summary lines INSIDE the diff content (at the beginning, before actual diff syntax)
         // These look like: "- Replaced Kafka..." "- Added message..." but appear before @@ or --- markers
         if (keyChanges.length === 0 && diffContent) {
-          const diffLines = diffContent.split(/\r?\n/);
+          // Walk the diff by newline offsets instead of splitting it
           const summaryLines: string[] = [];
-          let foundActualDiff = false;
+          let lineStart = 0;
           
-          for (const line of diffLines) {
+          while (lineStart <= diffContent.length) {
+            const newlineIndex = diffContent.indexOf('\n', lineStart);
+            const lineEnd = newlineIndex === -1 ? diffContent.length : newlineIndex;
+            const line = diffContent.slice(lineStart, lineEnd);
+            
             const trimmed = line.trim();
+            const first = trimmed.charAt(0);
             
-            // Check if we've hit actual diff syntax
-            if (trimmed.startsWith('@@') || trimmed.startsWith('---') || trimmed.startsWith('+++') || trimmed.match(/^diff\s+/)) {
-              foundActualDiff = true;
+            // Check if we've hit actual diff syntax (@@, ---, +++ or a diff command) with one anchored match
+            if (DIFF_SYNTAX_RE.test(trimmed)) {
               break;
             }
             
             // Collect lines that look like summary bullets (but not empty lines)
-            if (trimmed && (trimmed.startsWith('-') || trimmed.startsWith('*') || trimmed.startsWith('•'))) {
+            if (BULLET_CHARS.has(first)) {
               // Check if it's a descriptive summary (contains words like "Replaced", "Added", "Used", "Implemented", "Updated", "Removed", "Changed", "Fixed")
-              if (/^[-*•]\s*(Replaced|Added|Used|Implemented|Updated|Removed|Changed|Fixed|Created|Modified|Introduced|Migrated|Converted)/i.test(trimmed)) {
+              if (SUMMARY_BULLET_RE.test(trimmed)) {
                 summaryLines.push(trimmed);
               }
             }
+            
+            if (newlineIndex === -1) break;
+            lineStart = newlineIndex + 1;
           }
           
           if (summaryLines.length > 0) {
-            keyChanges = summaryLines.map(line => line.replace(/^[-*•]\s*/, '').trim());
+            keyChanges = summaryLines.map(line => line.replace(BULLET_PREFIX_RE, '').trim());
             
-            // Remove these summary lines from diff content
-            const summaryBlock = summaryLines.join('\n');
-            diffContent = diffContent.replace(new RegExp(summaryLines.map(l => l.replace(/[.*+?^${}()|[\]\\]/g, '\\$&')).join('[\\r\\n]+'), 'g'), '').trim();
+            // Remove these summary lines from diff content. Every occurrence of the block goes,
+            // including one repeated inside the diff body, and the result is always trimmed;
+            // the pattern is only built for the rare diffs that carry summary bullets.
+            const summaryBlockRe = new RegExp(summaryLines.map(l => l.replace(REGEX_SPECIAL_CHARS_RE, '\\$&')).join('[\\r\\n]+'), 'g');
+            diffContent = diffContent.replace(summaryBlockRe, '').trim();
           }
         }
         
+        // Split the diff once and share the lines between the hunk parser and the stats counter
+        const diffLines = diffContent.split(LINE_BREAK_RE);
         codeDiffs.push({
           file: fileName,
           diff_content: diffContent,
           description: description || undefined,
           key_changes: keyChanges.length > 0 ? keyChanges : undefined,
           language: this.inferLanguageFromFile(fileName),
-          hunks: this.parseDiffHunks(diffContent),
-          stats: this.calculateDiffStats(diffContent)
+          hunks: this.parseDiffHunks(diffLines),
+          stats: this.calculateDiffStats(diffLines)
         });
       }
 
@@ -850,7 +945,8 @@ export class PythonScriptService {
         stats: {
           total_files_with_kafka: kafkaInventory.length,
           total_files_with_diffs: codeDiffs.length,
-          sections_count: Object.keys({}).length
+          // The markdown fallback does not collect free-form sections
+          sections_count: 0
         }
       };
 
@@ -861,6 +957,59 @@ export class PythonScriptService {
     }
   }
 
+  /**
+   * Locate the first ```diff fenced block with plain index scans instead of a lazy regex.
+   * Returns the fence offset and the body without its surrounding line breaks.
+   */
+  private findDiffBlock(content: string): { start: number; body: string } | null {
+    const isLineBreak = (index: number) => content[index] === '\n' || content[index] === '\r';
+    let fenceIndex = content.indexOf('```diff');
+    
+    while (fenceIndex !== -1) {
+      let bodyStart = fenceIndex + '```diff'.length;
+      if (isLineBreak(bodyStart)) {
+        const runStart = bodyStart;
+        while (isLineBreak(bodyStart)) bodyStart++;
+        
+        // The closing fence must sit on its own line after the body
+        let closeIndex = content.indexOf('```', bodyStart);
+        while (closeIndex !== -1) {
+          if (closeIndex > bodyStart && isLineBreak(closeIndex - 1)) {
+            let bodyEnd = closeIndex - 1;
+            while (bodyEnd > bodyStart && isLineBreak(bodyEnd - 1)) bodyEnd--;
+            return { start: fenceIndex, body: content.slice(bodyStart, bodyEnd) };
+          }
+          closeIndex = content.indexOf('```', closeIndex + 1);
+        }
+        // A bare line-break run directly followed by a fence is an empty diff block
+        if (bodyStart - runStart > 1 && content.startsWith('```', bodyStart)) {
+          return { start: fenceIndex, body: '' };
+        }
+      }
+      fenceIndex = content.indexOf('```diff', fenceIndex + 1);
+    }
+    return null;
+  }
+
+  /**
+   * Match a "### <heading>" section by locating the literal heading text first (with a
+   * global, case-insensitive pattern) and running the sticky section pattern only from
+   * the "###" that precedes it
+   */
+  private matchReportSection(content: string, headingPattern: RegExp, sectionPattern: RegExp): RegExpExecArray | null {
+    headingPattern.lastIndex = 0;
+    let headingMatch: RegExpExecArray | null;
+    while ((headingMatch = headingPattern.exec(content)) !== null) {
+      const markerIndex = content.lastIndexOf('###', headingMatch.index);
+      if (markerIndex !== -1) {
+        sectionPattern.lastIndex = markerIndex;
+        const match = sectionPattern.exec(content);
+        if (match) return match;
+      }
+    }
+    return null;
+  }
+
   private inferLanguageFromFile(fileName: string): string {
     const extension = path.extname(fileName).toLowerCase();
     const languageMap: Record<string, string> = {
@@ -877,9 +1026,8 @@ export class PythonScriptService {
     return languageMap[extension] || 'text';
   }
 
-  private parseDiffHunks(diffContent: string): any[] {
+  private parseDiffHunks(lines: string[]): any[] {
     const hunks: any[] = [];
-    const lines = diffContent.split(/\r?\n/);
     
     let currentHunk: any = null;
     let oldPtr = 0;
@@ -894,7 +1042,7 @@ export class PythonScriptService {
       }
       
       // Check for hunk header: @@ -a,b +c,d @@
-      const hunkHeaderMatch = line.match(/^@@\s+-(\d+)(?:,(\d+))?\s+\+(\d+)(?:,(\d+))?\s+@@(.*)$/);
+      const hunkHeaderMatch = line.match(HUNK_HEADER_RE);
       if (hunkHeaderMatch) {
         // Save previous hunk if exists
         if (currentHunk) {
@@ -977,7 +1125,7 @@ export class PythonScriptService {
     }
     
     // If no hunks were created but there are diff lines, create a synthetic hunk
-    if (hunks.length === 0 && diffContent.trim()) {
+    if (hunks.length === 0) {
       const hasDiffLines = lines.some(line => 
         (line.startsWith('+') && !line.startsWith('+++')) ||
         (line.startsWith('-') && !line.startsWith('---'))
@@ -1043,8 +1191,7 @@ export class PythonScriptService {
     return hunks;
   }
 
-  private calculateDiffStats(diffContent: string): any {
-    const lines = diffContent.split(/\r?\n/);
+  private calculateDiffStats(lines: string[]): any {
     let additions = 0;
     let deletions = 0;
     let context = 0;
@@ -1100,8 +1247,7 @@ export class PythonScriptService {
       broadcastLog('INFO', `📄 Processing migration report: ${migrationReportFile.name}`);
       
       try {
-        const fileContent = await fs.promises.readFile(migrationReportFile.path, 'utf-8');
-        const parsedMigrationData = await this.extractStructuredData(fileContent);
+        const { data: parsedMigrationData } = await this.readParsedReport(migrationReportFile.path);
         
         if (!parsedMigrationData) {
           throw new Error('Failed to extract structured data from migration report');